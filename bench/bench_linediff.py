@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""对比 count_changed_lines 与 difflib 的耗时与结果（手工运行，不参与测试）
+
+用法：python3 bench/bench_linediff.py [--repeat N]
+"""
+import argparse
+import difflib
+import random
+import sys
+import timeit
+from pathlib import Path
+
+# Add project root to sys.path for lib import
+project_root = Path(__file__).resolve().parents[1]
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from lib.codexreview_linediff import count_changed_lines
+
+
+def difflib_changed_lines(old: str, new: str) -> int:
+    """difflib 基准：按 opcodes 统计 max(删除, 新增)"""
+    a = old.splitlines()
+    b = new.splitlines()
+    deleted = added = 0
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+        if tag in ("replace", "delete"):
+            deleted += i2 - i1
+        if tag in ("replace", "insert"):
+            added += j2 - j1
+    return max(deleted, added)
+
+
+def _cases():
+    rnd = random.Random(42)
+    block = [f"    value_{i} = compute({i}, {rnd.random():.6f})" for i in range(300)]
+    old = "\n".join(block)
+
+    one_char = list(block)
+    one_char[150] += "!"
+    yield "300 行中改 1 字符", old, "\n".join(one_char)
+
+    scattered = list(block)
+    for i in rnd.sample(range(300), 20):
+        scattered[i] = scattered[i].upper()
+    yield "300 行中散改 20 行", old, "\n".join(scattered)
+
+    big = [f"line {i} {rnd.random()}" for i in range(5000)]
+    rewritten = list(big)
+    for i in range(0, 5000, 7):
+        rewritten[i] = f"changed {i}"
+    yield "5000 行每 7 行改 1 行", "\n".join(big), "\n".join(rewritten)
+
+    repeated = ["}"] * 2000 + ["x"] * 2000
+    yield "4000 行高度重复", "\n".join(repeated), "\n".join(reversed(repeated))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'case':<24} {'ours':>8} {'difflib':>8} {'ours_ms':>10} {'difflib_ms':>12}")
+    for name, old, new in _cases():
+        ours = count_changed_lines(old, new)
+        ref = difflib_changed_lines(old, new)
+        t_ours = min(timeit.repeat(lambda: count_changed_lines(old, new), number=1, repeat=args.repeat))
+        t_ref = min(timeit.repeat(lambda: difflib_changed_lines(old, new), number=1, repeat=args.repeat))
+        print(f"{name:<24} {ours:>8} {ref:>8} {t_ours * 1000:>10.3f} {t_ref * 1000:>12.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
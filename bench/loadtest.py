@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""CodexReview hooks 压测：模拟 N 个并发 session 调用 record/stop hook
+
+每个 session 按给定速率发送 Edit/Write 事件（真实启动 bin/codexreview-record
+子进程），每 K 个事件触发一次 bin/codexreview-stop；review agent 由
+bench/stub_codeagent.py 通过 `CODEXREVIEW_AGENT_CMD` 接入。所有状态写入临时
+HOME，不影响真实的 ~/.claude。
+
+用法：python3 bench/loadtest.py --sessions 8 --events 50 --stop-every 10
+"""
+import argparse
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows：没有 getrusage，不统计块 I/O
+    resource = None
+
+project_root = Path(__file__).resolve().parents[1]
+RECORD_HOOK = project_root / "bin" / "codexreview-record"
+STOP_HOOK = project_root / "bin" / "codexreview-stop"
+STUB_AGENT = project_root / "bench" / "stub_codeagent.py"
+
+# Stop 每个仓库输出一行决策与一行结果，均以 repo=<仓库根> 结尾
+_RUN_LINE_RE = re.compile(r"^\[run=Y\].*?\bevents=(?P<events>\d+)\b.*\brepo=(?P<repo>.+)$", re.MULTILINE)
+# 只有这两种结果会清空该仓库的 pending；agent_unavailable 等跳过会保留 pending
+_CONSUMED_RE = re.compile(
+    r"^\[(?:review_completed\]|review_skipped\] reason=unchanged_since_last_review\b).*\brepo=(?P<repo>.+)$",
+    re.MULTILINE,
+)
+
+DEFAULTS = {
+    "sessions": 4,
+    "events": 20,
+    "record_rate": 0.0,
+    "parallel_records": 1,
+    "stop_every": 5,
+    "files_per_session": 8,
+    "agent_latency": 0.05,
+    "agent_jitter": 0.0,
+    "agent_output_lines": 5,
+    "agent_failure_rate": 0.0,
+    "seed": 0,
+}
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """返回毫秒为单位的 count/p50/p90/p99/max"""
+    if not samples:
+        return {"count": 0, "p50": 0.0, "p90": 0.0, "p99": 0.0, "max": 0.0}
+    data = sorted(samples)
+
+    def pick(q: float) -> float:
+        return data[min(len(data) - 1, int(round(q * (len(data) - 1))))] * 1000
+
+    return {
+        "count": len(data),
+        "p50": pick(0.50),
+        "p90": pick(0.90),
+        "p99": pick(0.99),
+        "max": data[-1] * 1000,
+    }
+
+
+def _run_hook(hook: Path, payload: Dict, env: Dict[str, str]):
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, str(hook)],
+        input=json.dumps(payload),
+        text=True,
+        capture_output=True,
+        env=env,
+    )
+    return time.perf_counter() - start, proc
+
+
+def _make_event(rnd: random.Random, session_id: str, repo: Path, files: List[Path], seq: int) -> Dict:
+    path = rnd.choice(files)
+    if rnd.random() < 0.5:
+        tool_name = "Write"
+        tool_input = {"file_path": str(path), "content": "\n".join(f"line {i}" for i in range(rnd.randint(1, 80)))}
+    else:
+        tool_name = "Edit"
+        tool_input = {"file_path": str(path), "old_string": f"a{seq}\nb\n", "new_string": f"a{seq}\nc\nd\n"}
+    return {
+        "session_id": session_id,
+        "cwd": str(repo),
+        "hook_event_name": "PostToolUse",
+        "tool_name": tool_name,
+        "tool_input": tool_input,
+        "tool_use_id": f"toolu_{session_id}_{seq}",
+    }
+
+
+def _run_session(index: int, opts: Dict, workdir: Path, env: Dict[str, str], stats: Dict, lock: threading.Lock) -> None:
+    rnd = random.Random(opts["seed"] * 1000 + index)
+    session_id = f"load-{index}"
+    repo = workdir / "repos" / session_id
+    files = []
+    for i in range(opts["files_per_session"]):
+        p = repo / f"pkg{i % 3}" / f"mod{i % 2}" / f"file{i}.py"
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_text(f"value = {i}\n", encoding="utf-8")
+        files.append(p)
+
+    interval = 1.0 / opts["record_rate"] if opts["record_rate"] > 0 else 0.0
+    sent = 0
+    pool = ThreadPoolExecutor(max_workers=max(1, opts["parallel_records"]))
+    try:
+        while sent < opts["events"]:
+            batch = min(opts["parallel_records"], opts["events"] - sent)
+            events = [_make_event(rnd, session_id, repo, files, sent + i) for i in range(batch)]
+            results = list(pool.map(lambda e: _run_hook(RECORD_HOOK, e, env), events))
+            sent += batch
+            with lock:
+                stats["sent"] += batch
+                for elapsed, proc in results:
+                    stats["record_latency"].append(elapsed)
+                    if proc.returncode != 0:
+                        stats["record_errors"] += 1
+
+            if opts["stop_every"] and sent % opts["stop_every"] < batch:
+                _run_stop(session_id, repo, env, stats, lock)
+
+            if interval:
+                time.sleep(interval * batch)
+    finally:
+        pool.shutdown()
+
+
+def parse_stop_output(out: str) -> Tuple[int, int, int]:
+    """
+    从 Stop 输出统计 (决定 review 的仓库数, pending 被清空的仓库数, 被清空的 events)
+
+    按 repo= 把每个仓库的 [run=Y] 行与结果行对应起来；只有 review_completed 与
+    reason=unchanged_since_last_review 会清空 pending。
+    """
+    to_review = {m.group("repo"): int(m.group("events")) for m in _RUN_LINE_RE.finditer(out)}
+    consumed = [m.group("repo") for m in _CONSUMED_RE.finditer(out) if m.group("repo") in to_review]
+    return len(to_review), len(consumed), sum(to_review[repo] for repo in consumed)
+
+
+def _run_stop(session_id: str, repo: Path, env: Dict[str, str], stats: Dict, lock: threading.Lock) -> None:
+    payload = {"session_id": session_id, "cwd": str(repo), "hook_event_name": "Stop", "stop_hook_active": False}
+    elapsed, proc = _run_hook(STOP_HOOK, payload, env)
+    attempted, completed, consumed = parse_stop_output(proc.stdout or "")
+    with lock:
+        stats["stop_latency"].append(elapsed)
+        if proc.returncode != 0:
+            stats["stop_errors"] += 1
+        stats["reviews_attempted"] += attempted
+        stats["reviews_completed"] += completed
+        stats["consumed"] += consumed
+
+
+def _state_io(state_root: Path) -> Dict:
+    total = 0
+    files = 0
+    tmp_left = 0
+    if state_root.exists():
+        for p in state_root.rglob("*"):
+            if p.is_file():
+                files += 1
+                total += p.stat().st_size
+                if p.name.endswith(".tmp"):
+                    tmp_left += 1
+    return {"state_files": files, "state_bytes": total, "tmp_files_left": tmp_left}
+
+
+def run_load(**overrides) -> Dict:
+    """
+    执行一次压测并返回报告
+
+    参数见 DEFAULTS；报告包含吞吐、hook 延迟分布、丢失事件数与状态文件 I/O。
+    """
+    opts = dict(DEFAULTS)
+    opts.update(overrides)
+
+    workdir = Path(tempfile.mkdtemp(prefix="codexreview-load-"))
+    try:
+        env = dict(os.environ)
+        env["HOME"] = str(workdir / "home")
+        env["USERPROFILE"] = env["HOME"]
+        env["CODEXREVIEW_AGENT_CMD"] = json.dumps(
+            [
+                sys.executable,
+                str(STUB_AGENT),
+                "--latency", str(opts["agent_latency"]),
+                "--jitter", str(opts["agent_jitter"]),
+                "--output-lines", str(opts["agent_output_lines"]),
+                "--failure-rate", str(opts["agent_failure_rate"]),
+            ]
+        )
+
+        stats = {
+            "sent": 0,
+            "consumed": 0,
+            "record_errors": 0,
+            "stop_errors": 0,
+            "reviews_attempted": 0,
+            "reviews_completed": 0,
+            "record_latency": [],
+            "stop_latency": [],
+        }
+        lock = threading.Lock()
+        usage_before = resource.getrusage(resource.RUSAGE_CHILDREN) if resource else None
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=opts["sessions"]) as pool:
+            futures = [
+                pool.submit(_run_session, i, opts, workdir, env, stats, lock)
+                for i in range(opts["sessions"])
+            ]
+            for f in futures:
+                f.result()
+        wall = time.perf_counter() - start
+
+        usage_after = resource.getrusage(resource.RUSAGE_CHILDREN) if resource else None
+        state_root = workdir / "home" / ".claude" / "state" / "codexreview"
+
+        remaining = 0
+        for i in range(opts["sessions"]):
+            p = state_root / f"load-{i}.json"
+            if p.exists():
+                remaining += json.loads(p.read_text(encoding="utf-8"))["pending"]["events"]
+
+        invocations = len(stats["record_latency"]) + len(stats["stop_latency"])
+        io = _state_io(state_root)
+        # 平台不支持时为 None
+        io["block_reads"] = usage_after.ru_inblock - usage_before.ru_inblock if usage_after else None
+        io["block_writes"] = usage_after.ru_oublock - usage_before.ru_oublock if usage_after else None
+
+        return {
+            "options": opts,
+            "wall_seconds": wall,
+            "throughput": {
+                "hooks_per_sec": invocations / wall if wall else 0.0,
+                "events_per_sec": stats["sent"] / wall if wall else 0.0,
+            },
+            "events": {
+                "sent": stats["sent"],
+                "reviewed": stats["consumed"],
+                "pending": remaining,
+                "lost": stats["sent"] - stats["consumed"] - remaining,
+            },
+            "reviews": {
+                "attempted": stats["reviews_attempted"],
+                "completed": stats["reviews_completed"],
+            },
+            "errors": {"record": stats["record_errors"], "stop": stats["stop_errors"]},
+            "latency_ms": {
+                "record": percentiles(stats["record_latency"]),
+                "stop": percentiles(stats["stop_latency"]),
+            },
+            "state_io": io,
+            "workdir": str(workdir) if opts.get("keep") else None,
+        }
+    finally:
+        if not opts.get("keep"):
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _print_report(report: Dict) -> None:
+    ev = report["events"]
+    print(f"wall={report['wall_seconds']:.2f}s "
+          f"hooks/s={report['throughput']['hooks_per_sec']:.1f} "
+          f"events/s={report['throughput']['events_per_sec']:.1f}")
+    print(f"events: sent={ev['sent']} reviewed={ev['reviewed']} pending={ev['pending']} lost={ev['lost']}")
+    print(f"reviews: attempted={report['reviews']['attempted']} completed={report['reviews']['completed']} "
+          f"errors: record={report['errors']['record']} stop={report['errors']['stop']}")
+    for hook, lat in report["latency_ms"].items():
+        print(f"latency[{hook}]: n={lat['count']} p50={lat['p50']:.1f}ms p90={lat['p90']:.1f}ms "
+              f"p99={lat['p99']:.1f}ms max={lat['max']:.1f}ms")
+    io = report["state_io"]
+    print(f"state: files={io['state_files']} bytes={io['state_bytes']} tmp_left={io['tmp_files_left']} "
+          f"block_reads={io['block_reads']} block_writes={io['block_writes']}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=DEFAULTS["sessions"], help="并发 session 数")
+    parser.add_argument("--events", type=int, default=DEFAULTS["events"], help="每个 session 的 record 事件数")
+    parser.add_argument("--record-rate", type=float, default=DEFAULTS["record_rate"],
+                        help="每个 session 每秒 record 次数（0 表示不限速）")
+    parser.add_argument("--parallel-records", type=int, default=DEFAULTS["parallel_records"],
+                        help="同一 session 内同时进行的 record hook 数（模拟并行工具调用）")
+    parser.add_argument("--stop-every", type=int, default=DEFAULTS["stop_every"], help="每 K 个事件触发一次 Stop")
+    parser.add_argument("--files-per-session", type=int, default=DEFAULTS["files_per_session"])
+    parser.add_argument("--agent-latency", type=float, default=DEFAULTS["agent_latency"])
+    parser.add_argument("--agent-jitter", type=float, default=DEFAULTS["agent_jitter"])
+    parser.add_argument("--agent-output-lines", type=int, default=DEFAULTS["agent_output_lines"])
+    parser.add_argument("--agent-failure-rate", type=float, default=DEFAULTS["agent_failure_rate"])
+    parser.add_argument("--seed", type=int, default=DEFAULTS["seed"])
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出报告")
+    parser.add_argument("--keep", action="store_true", help="保留临时目录（便于检查状态文件）")
+    args = parser.parse_args()
+
+    report = run_load(**{k: v for k, v in vars(args).items() if k != "json"})
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        _print_report(report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
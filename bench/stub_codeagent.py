@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""本地桩 codeagent：模拟 review agent 的耗时、输出量与失败率（供压测使用）
+
+通过 `CODEXREVIEW_AGENT_CMD` 接入，例如：
+    CODEXREVIEW_AGENT_CMD='["python3","bench/stub_codeagent.py","--latency","0.5"]'
+"""
+import argparse
+import random
+import re
+import sys
+import time
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.0, help="平均耗时（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="耗时随机抖动幅度（秒）")
+    parser.add_argument("--output-lines", type=int, default=5, help="输出的 finding 行数")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="以非 0 退出码结束的概率")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--version", action="version", version="stub-codeagent 0.0")
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    prompt = sys.stdin.read()
+
+    delay = max(0.0, args.latency + rnd.uniform(-args.jitter, args.jitter))
+    if delay:
+        time.sleep(delay)
+
+    if rnd.random() < args.failure_rate:
+        print("stub agent: simulated failure", file=sys.stderr)
+        return 1
+
+    m = re.search(r"变更文件: (.*)", prompt)
+    files = m.group(1).split() if m else ["unknown.py"]
+    severities = ["P0", "P1", "P2", "P3"]
+    for i in range(args.output_lines):
+        print(f"- [{rnd.choice(severities)}] {rnd.choice(files)}:{rnd.randint(1, 200)} stub finding #{i}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
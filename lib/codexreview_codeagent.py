@@ -4,11 +4,25 @@ from __future__ import annotations
 
 import json
 import os
+import hashlib
 import platform
 import shlex
+import shutil
+import subprocess
 import sys
+import time
+import uuid
 from pathlib import Path
-from typing import List, Mapping, Optional, Tuple
+from typing import Dict, List, Mapping, Optional, Tuple
+
+AGENT_CMD_ENV = "CODEXREVIEW_AGENT_CMD"
+# 设为 1 时 preflight 额外运行一次 `<agent 可执行文件> --version` 并记录结果（不影响是否 review）
+AGENT_PROBE_ENV = "CODEXREVIEW_AGENT_PROBE"
+
+AGENT_CACHE_VERSION = 1
+PROBE_TIMEOUT = 10
+# 校验失败的结果只缓存这么久（秒），之后即使文件未变也重新探测
+NEGATIVE_TTL = 300
 
 
 def _truthy_env(value: Optional[str], default: bool) -> bool:
@@ -62,6 +76,22 @@ def resolve_packaged_binary(project_root: Path) -> Optional[Path]:
     return None
 
 
+def _parse_override(override: str) -> List[str]:
+    s = override.strip()
+    # 允许用 JSON 数组指定命令，避免 Windows 路径/空格/引号导致的解析差异：
+    # 例如：["C:\\Program Files\\codeagent\\codeagent.exe","--flag"]
+    if s.startswith("["):
+        try:
+            parsed = json.loads(s)
+            if isinstance(parsed, list) and all(isinstance(x, str) for x in parsed) and parsed:
+                return parsed
+        except Exception:
+            pass
+
+    # 兼容传统写法（需要在含空格路径时自行加引号）
+    return shlex.split(override)
+
+
 def resolve_agent_cmd(project_root: Path, env: Mapping[str, str] | None = None) -> List[str]:
     """
     解析用于执行 review 的 agent 命令。
@@ -74,21 +104,9 @@ def resolve_agent_cmd(project_root: Path, env: Mapping[str, str] | None = None)
     if env is None:
         env = os.environ
 
-    override = env.get("CODEXREVIEW_AGENT_CMD")
+    override = env.get(AGENT_CMD_ENV)
     if override:
-        s = override.strip()
-        # 允许用 JSON 数组指定命令，避免 Windows 路径/空格/引号导致的解析差异：
-        # 例如：["C:\\Program Files\\codeagent\\codeagent.exe","--flag"]
-        if s.startswith("["):
-            try:
-                parsed = json.loads(s)
-                if isinstance(parsed, list) and all(isinstance(x, str) for x in parsed) and parsed:
-                    return parsed
-            except Exception:
-                pass
-
-        # 兼容传统写法（需要在含空格路径时自行加引号）
-        return shlex.split(override)
+        return _parse_override(override)
 
     packaged = resolve_packaged_binary(project_root)
     if packaged is None:
@@ -103,3 +121,153 @@ def resolve_agent_cmd(project_root: Path, env: Mapping[str, str] | None = None)
             pass
 
     return [str(packaged)]
+
+
+def _file_stamp(path: Optional[str]) -> Optional[List[int]]:
+    if not path:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _resolution_key(project_root: Path, env: Mapping[str, str]) -> Tuple[str, List[str], Optional[str], List]:
+    """
+    不做 chmod/哈希/探测，只用 stat 确定“将会使用哪个 agent”
+
+    Returns:
+        (来源 env/packaged/path, 命令, 可执行文件路径或 None, 缓存 key)
+    """
+    probe = _truthy_env(env.get(AGENT_PROBE_ENV), False)
+    override = env.get(AGENT_CMD_ENV)
+    if override:
+        cmd = _parse_override(override)
+        exe = shutil.which(cmd[0], path=env.get("PATH")) if cmd else None
+        return "env", cmd, exe, ["env", override, exe, _file_stamp(exe), probe]
+
+    os_name, machine = _detect_platform()
+    candidate = project_root / "codeagent" / _asset_filename(os_name, _normalize_arch(machine))
+    stamp = _file_stamp(str(candidate))
+    if stamp is not None:
+        return "packaged", [str(candidate)], str(candidate), ["packaged", str(candidate), stamp, probe]
+
+    exe = shutil.which("codeagent", path=env.get("PATH"))
+    return "path", ["codeagent"], exe, ["path", exe, _file_stamp(exe), probe]
+
+
+def agent_cache_path(key: List) -> Path:
+    # 延迟导入：保持本模块可在不依赖状态目录的场景下单独使用
+    from lib.codexreview_state import state_dir
+
+    digest = hashlib.sha1(json.dumps(key).encode("utf-8")).hexdigest()[:16]
+    return state_dir() / "cache" / f"agent-{digest}.json"
+
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _probe(exe: str) -> Tuple[bool, str]:
+    """运行 `<exe> --version`（不带用户配置的其它参数），返回 (是否成功, 输出首行或错误信息)"""
+    try:
+        proc = subprocess.run(
+            [exe, "--version"],
+            stdin=subprocess.DEVNULL,
+            capture_output=True,
+            text=True,
+            timeout=PROBE_TIMEOUT,
+        )
+    except subprocess.TimeoutExpired:
+        return False, f"timed out after {PROBE_TIMEOUT}s"
+    except OSError as e:
+        return False, str(e)
+    lines = [l.strip() for l in f"{proc.stdout or ''}\n{proc.stderr or ''}".splitlines() if l.strip()]
+    first = lines[0] if lines else ""
+    if proc.returncode != 0:
+        return False, f"exit {proc.returncode}: {first}".rstrip(": ")
+    return True, first
+
+
+def _verify(source: str, cmd: List[str], exe: Optional[str], probe: bool) -> Dict:
+    result: Dict = {"ok": False, "source": source, "cmd": cmd, "executable": exe, "sha256": None, "version": None}
+    if not cmd:
+        result["error"] = f"{AGENT_CMD_ENV} is empty"
+        return result
+    if exe is None:
+        result["error"] = f"agent not found: {cmd[0]}"
+        return result
+
+    # 离线分发的二进制在类 Unix 上确保可执行（只在缓存未命中时尝试）
+    if source == "packaged" and not exe.lower().endswith(".exe") and not os.access(exe, os.X_OK):
+        try:
+            os.chmod(exe, os.stat(exe).st_mode | 0o111)
+        except OSError:
+            pass
+    if not os.access(exe, os.X_OK):
+        result["error"] = f"agent is not executable: {exe}"
+        return result
+
+    try:
+        result["sha256"] = _sha256(exe)
+    except OSError as e:
+        result["error"] = f"cannot read agent: {e}"
+        return result
+
+    # 探测结果只做记录：并非所有 agent 都支持 --version，失败不阻止 review
+    if probe:
+        ok, output = _probe(exe)
+        result["probe"] = {"ok": ok, "output": output}
+        if ok:
+            result["version"] = output
+
+    result["ok"] = True
+    return result
+
+
+def preflight_agent(project_root: Path, env: Mapping[str, str] | None = None) -> Dict:
+    """
+    解析并校验 review agent（结果按 agent 来源与可执行文件 size/mtime 缓存）
+
+    缓存命中时只需若干次 stat；未命中时才会 chmod、计算 sha256，并在开启
+    CODEXREVIEW_AGENT_PROBE 时运行 `<可执行文件> --version`。只有找不到或不可执行
+    才判为不可用（ok=False，缓存 NEGATIVE_TTL 秒）；探测失败只记录在 probe 中。
+
+    Returns:
+        {"ok", "source", "cmd", "executable", "sha256", "version", "probe"?, "error"?, "checked_at", "cached"}
+    """
+    if env is None:
+        env = os.environ
+
+    source, cmd, exe, key = _resolution_key(project_root, env)
+    cache_path = agent_cache_path(key)
+    now = time.time()
+    try:
+        cached = json.loads(cache_path.read_text(encoding="utf-8"))
+        if (
+            cached.get("version") == AGENT_CACHE_VERSION
+            and cached.get("key") == key
+            and (cached["result"]["ok"] or now - cached["result"]["checked_at"] < NEGATIVE_TTL)
+        ):
+            return {**cached["result"], "cached": True}
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        pass
+
+    result = _verify(source, cmd, exe, key[-1])
+    result["checked_at"] = now
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cache_path.with_name(f"{cache_path.name}.{uuid.uuid4().hex}.tmp")
+        tmp.write_text(
+            json.dumps({"version": AGENT_CACHE_VERSION, "key": key, "result": result}, ensure_ascii=True),
+            encoding="utf-8",
+        )
+        os.replace(tmp, cache_path)
+    except OSError:
+        pass
+    return {**result, "cached": False}
@@ -0,0 +1,250 @@
+"""CodexReview 配置：用户级 + 仓库级分层配置，按文件 mtime 缓存并自动重载
+
+配置文件（JSON，均可选）：
+- 用户级：~/.claude/codexreview.json
+- 仓库级：<仓库根>/.claude/codexreview.json（覆盖用户级）
+
+合并、校验后的结果按仓库写入 state_dir()/cache/，以两个配置文件的 mtime/size
+作为缓存 key；文件未变化时 hook 直接读取缓存，不再重复解析与校验。
+"""
+
+from __future__ import annotations
+
+import copy
+import hashlib
+import json
+import os
+import sys
+import uuid
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+CONFIG_FILENAME = "codexreview.json"
+CACHE_VERSION = 1
+# 每个仓库一个缓存文件；超出后删除最久未写入的（被删的仓库下次调用时重新解析即可）
+CACHE_KEEP = 64
+
+DEFAULT_CONFIG: Dict = {
+    # 灰区评分达到该值时运行 review
+    "score_threshold": 4,
+    # 分档阈值（升序）：指标每达到一档 +1 分
+    "bands": {
+        "events": [4, 8],
+        "files": [2, 4],
+        "modules": [2],
+        "lines": [30, 100],
+    },
+    # Write 单次计入的行数上限
+    "write_cap": 200,
+    # 方案/设计文档：路径包含 plan_dirs，或扩展名在 plan_extensions 且文件名包含 plan_keywords
+    "plan_dirs": ["docs/plans/"],
+    "plan_extensions": [".md"],
+    "plan_keywords": ["design", "spec", "requirement", "implementation", "proposal", "adr", "rfc"],
+    # 高风险文件：文件名等于 risk_basenames、文件名包含 risk_name_keywords，或路径包含 risk_dirs
+    "risk_basenames": ["package.json", "dockerfile"],
+    "risk_name_keywords": ["lock"],
+    "risk_dirs": [".github/workflows/"],
+    # 内容风险规则：按类别覆盖默认规则（格式见 codexreview_content_risk）
+    "content_patterns": {},
+    # 额外忽略的 glob（gitignore 语法，相对仓库根）
+    "ignore_globs": [],
+}
+
+_STR_LIST_KEYS = (
+    "plan_dirs",
+    "plan_extensions",
+    "plan_keywords",
+    "risk_basenames",
+    "risk_name_keywords",
+    "risk_dirs",
+    "ignore_globs",
+)
+# 这些列表按小写比较
+_LOWER_KEYS = ("plan_extensions", "plan_keywords", "risk_basenames", "risk_name_keywords")
+
+
+def user_config_path() -> Path:
+    return Path.home() / ".claude" / CONFIG_FILENAME
+
+
+def repo_config_path(repo_root: str) -> Path:
+    return Path(repo_root) / ".claude" / CONFIG_FILENAME
+
+
+def _warn(source: str, message: str) -> None:
+    print(f"codexreview: {source}: {message}", file=sys.stderr)
+
+
+def _is_int(v) -> bool:
+    return isinstance(v, int) and not isinstance(v, bool)
+
+
+def validate_layer(raw, source: str) -> Dict:
+    """
+    校验单个配置文件的内容，只保留合法字段
+
+    非法字段输出警告后丢弃（沿用下层配置），不会让 hook 失败。
+    """
+    if not isinstance(raw, dict):
+        _warn(source, "top-level value must be an object")
+        return {}
+
+    layer: Dict = {}
+    for key, value in raw.items():
+        if key not in DEFAULT_CONFIG:
+            _warn(source, f"unknown key {key!r}")
+        elif key in ("score_threshold", "write_cap"):
+            if _is_int(value) and value >= 0:
+                layer[key] = value
+            else:
+                _warn(source, f"{key} must be a non-negative integer")
+        elif key == "bands":
+            if not isinstance(value, dict):
+                _warn(source, "bands must be an object")
+                continue
+            bands = {}
+            for name, thresholds in value.items():
+                if name not in DEFAULT_CONFIG["bands"]:
+                    _warn(source, f"unknown band {name!r}")
+                elif (
+                    isinstance(thresholds, list)
+                    and all(_is_int(t) and t > 0 for t in thresholds)
+                    and thresholds == sorted(thresholds)
+                ):
+                    bands[name] = thresholds
+                else:
+                    _warn(source, f"bands.{name} must be an ascending list of positive integers")
+            if bands:
+                layer["bands"] = bands
+        elif key in _STR_LIST_KEYS:
+            if isinstance(value, list) and all(isinstance(v, str) for v in value):
+                layer[key] = [v.lower() for v in value] if key in _LOWER_KEYS else list(value)
+            else:
+                _warn(source, f"{key} must be a list of strings")
+        elif key == "content_patterns":
+            if isinstance(value, dict) and all(isinstance(v, list) for v in value.values()):
+                layer[key] = value
+            else:
+                _warn(source, "content_patterns must map category names to lists of rules")
+    return layer
+
+
+def merge_layers(*layers: Dict) -> Dict:
+    """按顺序把各层叠加到默认配置上：bands/content_patterns 按子键合并，其余整体覆盖"""
+    merged = copy.deepcopy(DEFAULT_CONFIG)
+    for layer in layers:
+        for key, value in layer.items():
+            if key in ("bands", "content_patterns"):
+                merged[key].update(copy.deepcopy(value))
+            else:
+                merged[key] = copy.deepcopy(value)
+    merged["fingerprint"] = hashlib.sha1(
+        json.dumps(merged, sort_keys=True).encode("utf-8")
+    ).hexdigest()[:16]
+    return merged
+
+
+def _stamp(path: Path) -> Optional[List[int]]:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _read_layer(path: Path) -> Dict:
+    try:
+        raw = json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        _warn(str(path), f"cannot parse ({e})")
+        return {}
+    return validate_layer(raw, str(path))
+
+
+def _cache_path(repo_root: str) -> Path:
+    # 延迟导入：codexreview_state 依赖本模块
+    from lib.codexreview_state import state_dir
+
+    digest = hashlib.sha1(str(repo_root).encode("utf-8")).hexdigest()[:16]
+    return state_dir() / "cache" / f"config-{digest}.json"
+
+
+# (仓库根) -> (stamps, config)：同一进程内（watcher、测试）免去读缓存文件
+_MEMO: Dict[str, Tuple[List, Dict]] = {}
+
+
+def load_config(repo_root: Optional[str] = None) -> Dict:
+    """
+    返回仓库生效的配置（合并、校验后的字典，附带 fingerprint）
+
+    两个配置文件的 mtime/size 与缓存一致时直接复用缓存；任一文件变化
+    （新增、修改、删除）都会触发重新解析，即配置热更新。
+    """
+    sources = [user_config_path()]
+    if repo_root:
+        sources.append(repo_config_path(repo_root))
+    # 默认配置的指纹也计入 key：升级后内置默认值变化时缓存随之失效
+    stamps = [["defaults", default_config()["fingerprint"]]]
+    stamps += [[str(p), _stamp(p)] for p in sources]
+    key = str(repo_root or "")
+
+    memo = _MEMO.get(key)
+    if memo is not None and memo[0] == stamps:
+        return memo[1]
+
+    cache_path = _cache_path(key)
+    try:
+        cached = json.loads(cache_path.read_text(encoding="utf-8"))
+        if cached.get("version") == CACHE_VERSION and cached.get("stamps") == stamps:
+            _MEMO[key] = (stamps, cached["config"])
+            return cached["config"]
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    layers = [_read_layer(p) for p, (_, stamp) in zip(sources, stamps[1:]) if stamp is not None]
+    config = merge_layers(*layers)
+    _MEMO[key] = (stamps, config)
+
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cache_path.with_name(f"{cache_path.name}.{uuid.uuid4().hex}.tmp")
+        tmp.write_text(
+            json.dumps({"version": CACHE_VERSION, "stamps": stamps, "config": config}, ensure_ascii=True),
+            encoding="utf-8",
+        )
+        os.replace(tmp, cache_path)
+        _evict_cache(cache_path.parent)
+    except OSError:
+        pass
+    return config
+
+
+def _evict_cache(directory: Path) -> None:
+    """只在写入新缓存（未命中）时调用，命中路径上没有额外开销"""
+    keep = CACHE_KEEP
+    entries = []
+    for p in directory.glob("config-*.json"):
+        try:
+            entries.append((p.stat().st_mtime_ns, p))
+        except OSError:
+            continue
+    entries.sort()
+    for _, p in entries[: max(0, len(entries) - keep)]:
+        try:
+            p.unlink()
+        except OSError:
+            pass
+
+
+@lru_cache(maxsize=1)
+def default_config() -> Dict:
+    """不读任何配置文件的默认配置（已附带 fingerprint；调用方不要修改返回值）"""
+    return merge_layers()
+
+
+def band_score(value: int, thresholds: List[int]) -> int:
+    """value 达到的档数（thresholds 升序）"""
+    return sum(1 for t in thresholds if value >= t)
@@ -0,0 +1,213 @@
+"""CodexReview 内容风险扫描：在新增内容中查找密钥、shell 调用、裸 SQL、鉴权绕过等"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import sys
+from functools import lru_cache
+from typing import Dict, List, Mapping, Optional, Tuple, Union
+
+# 指向 JSON 文件：{"<类别>": [<规则>, ...]}，同名类别覆盖默认规则，空列表表示禁用该类别
+PATTERNS_ENV = "CODEXREVIEW_CONTENT_PATTERNS"
+
+# 关键字命中后，在其所在行（前后最多这么多字节）上运行确认正则
+_VERIFY_WINDOW = 2000
+
+# 规则：
+# - 字符串：字面关键字，大小写不敏感，命中即算
+# - {"keywords": [...], "regex": "..."}：任一关键字命中后，再用 regex 在所在行上确认
+# 扫描只对关键字做一遍多模式匹配，确认正则只在命中的少数行上运行（且在
+# 第一次用到时才编译），因此整体对输入长度线性，不受确认正则复杂度影响。
+Rule = Union[str, Dict]
+
+DEFAULT_CONTENT_PATTERNS: Dict[str, List[Rule]] = {
+    "secret": [
+        {"keywords": ["private key"], "regex": r"-----BEGIN (?:[A-Z]+ )?PRIVATE KEY"},
+        {"keywords": ["akia"], "regex": r"\bAKIA[0-9A-Z]{16}\b"},
+        {"keywords": ["ghp_", "gho_", "ghu_", "ghs_", "ghr_"], "regex": r"\bgh[pousr]_[A-Za-z0-9]{36}\b"},
+        {"keywords": ["xoxb-", "xoxp-", "xoxa-", "xoxo-", "xoxs-", "xoxr-"], "regex": r"\bxox[abposr]-[A-Za-z0-9-]{10,}"},
+        {"keywords": ["sk-"], "regex": r"\bsk-[A-Za-z0-9_-]{20,}"},
+        {
+            "keywords": ["api_key", "apikey", "api-key", "secret", "password", "passwd", "token"],
+            "regex": r"(?i)(?:api[_-]?key|secret|passw(?:or)?d|token)[\w-]{0,20}[\"']?\s{0,8}[:=]\s{0,8}[\"'][^\"'\s]{8,}",
+        },
+    ],
+    "shell_exec": [
+        {"keywords": ["shell=true", "shell = true"], "regex": r"\bsubprocess\.\w+\(.{0,400}shell\s*=\s*True"},
+        {"keywords": ["os.system", "os.popen"], "regex": r"\bos\.(?:system|popen)\s*\("},
+        "child_process",
+        "runtime.getruntime().exec",
+        {"keywords": ["exec.command("], "regex": r"\bexec\.Command\(\s*\"(?:sh|bash)\""},
+    ],
+    # SQL 规则要求语句结构（列清单/* + FROM 表名、WHERE/SET/VALUES 等），
+    # 避免 "select one item from the list" 之类的注释/文档被当成 SQL；
+    # SELECT/UPDATE 这类常见英文单词还要求大写关键字或位于字符串字面量开头
+    "raw_sql": [
+        {
+            "keywords": ["select "],
+            "regex": (
+                r"\bSELECT\s+(?:DISTINCT\s+)?(?:\*|[\w.]+(?:\s*,\s*[\w.]+)*)\s+FROM\s+[\w.`\"\[]"
+                r"|(?i:\bselect\s+(?:distinct\s+)?(?:[\w.]+\.)?\*\s+from\s+[\w.`\"\[])"
+                r"|(?i:[\"'`]\s*select\s+(?:distinct\s+)?[\w.]+(?:\s*,\s*[\w.]+)*\s+from\s+[\w.`\"\[])"
+            ),
+        },
+        {
+            "keywords": ["insert into"],
+            "regex": r"(?i)\binsert\s+into\s+[\w.`\"\[\]]+\s*(?:\([^)]*\)\s*)?(?:values|select)\b",
+        },
+        {
+            "keywords": ["update "],
+            "regex": (
+                r"\bUPDATE\s+[\w.`\"\[\]]+\s+SET\s+[\w.`\"\[\]]+\s*="
+                r"|(?i:[\"'`]\s*update\s+[\w.`\[\]]+\s+set\s+[\w.`\[\]]+\s*=)"
+            ),
+        },
+        {
+            "keywords": ["delete from"],
+            "regex": r"(?i)\bdelete\s+from\s+[\w.`\"\[\]]+\s*(?:where\b|;|[\"'`)]|$)",
+        },
+        {"keywords": [".execute("], "regex": r"\.execute\(\s*(?:f[\"']|[\"'][^\"']*[\"']\s*(?:%|\+|\.format\())"},
+        {"keywords": [".raw("], "regex": r"\.raw\(\s*f?[\"']"},
+    ],
+    "auth_bypass": [
+        {"keywords": ["verify=false", "verify = false"], "regex": r"\bverify\s*=\s*False\b"},
+        "@csrf_exempt",
+        {"keywords": ["allowany"], "regex": r"\bAllowAny\b"},
+        "permitall()",
+        {"keywords": ["insecureskipverify"], "regex": r"\bInsecureSkipVerify:\s*true\b"},
+        {"keywords": ["node_tls_reject_unauthorized"], "regex": r"NODE_TLS_REJECT_UNAUTHORIZED\s*=\s*[\"']?0"},
+        {
+            "keywords": ["skip_auth", "skipauth", "skip-auth", "bypass", "disable_auth", "disableauth"],
+            "regex": r"(?i)\b(?:skip|bypass|disable)[_-]?(?:auth|authentication|authorization|login)\b",
+        },
+    ],
+}
+
+
+class _Matcher:
+    """
+    规则集：一个关键字多模式正则 + 关键字到 (类别, 确认正则源码) 的映射
+
+    record hook 每次都是新进程，而大多数编辑一个关键字都不会命中，因此只预先
+    编译关键字正则；确认正则在其关键字第一次命中时才编译，并按源码缓存。
+    """
+
+    def __init__(self, keyword_re: Optional[re.Pattern], rules: Dict[bytes, List[Tuple[str, Optional[str]]]]):
+        self.keyword_re = keyword_re
+        self.rules = rules
+        self.categories = {c for entries in rules.values() for c, _ in entries}
+        self._verifiers: Dict[Tuple[str, str], Optional[re.Pattern]] = {}
+
+    def verifier(self, category: str, regex: str) -> Optional[re.Pattern]:
+        """编译（并缓存）确认正则；正则非法时提示一次并返回 None，该规则不再命中"""
+        key = (category, regex)
+        if key not in self._verifiers:
+            try:
+                self._verifiers[key] = re.compile(regex.encode("utf-8"))
+            except re.error as e:
+                print(f"codexreview: invalid content pattern for {category!r}: {regex!r} ({e})", file=sys.stderr)
+                self._verifiers[key] = None
+        return self._verifiers[key]
+
+
+@lru_cache(maxsize=8)
+def _compile(frozen: str) -> _Matcher:
+    patterns = json.loads(frozen)
+    rules: Dict[bytes, List[Tuple[str, Optional[str]]]] = {}
+    for category, entries in patterns.items():
+        for entry in entries:
+            if isinstance(entry, str):
+                keywords, regex = [entry], None
+            elif isinstance(entry, dict) and entry.get("keywords"):
+                keywords, regex = entry["keywords"], entry.get("regex") or None
+            else:
+                continue
+            for kw in keywords:
+                kw_bytes = str(kw).lower().encode("utf-8")
+                if kw_bytes:
+                    rules.setdefault(kw_bytes, []).append((category, regex))
+
+    if not rules:
+        return _Matcher(None, {})
+    # 长关键字优先，避免被其前缀关键字抢先匹配
+    alternation = b"|".join(re.escape(k) for k in sorted(rules, key=len, reverse=True))
+    return _Matcher(re.compile(alternation), rules)
+
+
+def _freeze(patterns: Mapping[str, List[Rule]]) -> str:
+    return json.dumps(patterns, sort_keys=True)
+
+
+def load_content_patterns(
+    env: Mapping[str, str] | None = None, overrides: Mapping[str, List[Rule]] | None = None
+) -> Dict[str, List[Rule]]:
+    """
+    生效的内容风险规则
+
+    依次叠加：默认规则、配置文件中的 content_patterns（overrides）、
+    `CODEXREVIEW_CONTENT_PATTERNS` 指向的 JSON 文件（读取失败时忽略）。
+    """
+    if env is None:
+        env = os.environ
+    patterns = {k: list(v) for k, v in DEFAULT_CONTENT_PATTERNS.items()}
+    for category, entries in (overrides or {}).items():
+        patterns[str(category)] = list(entries)
+    path = env.get(PATTERNS_ENV)
+    if not path:
+        return {k: v for k, v in patterns.items() if v}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            extra = json.load(f)
+    except (OSError, ValueError):
+        return patterns
+    if isinstance(extra, dict):
+        for category, entries in extra.items():
+            if isinstance(entries, list):
+                patterns[str(category)] = entries
+    return {k: v for k, v in patterns.items() if v}
+
+
+def scan_content(text: str, patterns: Mapping[str, List[Rule]] | None = None) -> List[str]:
+    """
+    扫描文本，返回命中的风险类别（排序去重）
+
+    先在小写化的字节串上用一个多关键字正则做单遍扫描，命中关键字后只在
+    所在行上运行该规则的确认正则；所有类别都已命中时提前结束。
+    """
+    if not text:
+        return []
+    matcher = _compile(_freeze(DEFAULT_CONTENT_PATTERNS if patterns is None else patterns))
+    if matcher.keyword_re is None:
+        return []
+
+    # bytes.lower() 只处理 ASCII，长度不变，位置可直接对应回原文
+    data = text.encode("utf-8", "surrogatepass")
+    lowered = data.lower()
+
+    hits = set()
+    # 同一行上同一确认正则只跑一次（关键字密集时避免重复确认）
+    line_start = line_end = -1
+    verified = set()
+    for m in matcher.keyword_re.finditer(lowered):
+        pos = m.start()
+        if pos >= line_end:
+            line_start = max(data.rfind(b"\n", 0, pos) + 1, pos - _VERIFY_WINDOW)
+            line_end = data.find(b"\n", pos)
+            line_end = min(len(data) if line_end < 0 else line_end, pos + _VERIFY_WINDOW)
+            verified.clear()
+        for category, regex in matcher.rules[m.group()]:
+            if category in hits or (category, regex) in verified:
+                continue
+            if regex is None:
+                hits.add(category)
+                continue
+            verify = matcher.verifier(category, regex)
+            if verify is not None and verify.search(data, line_start, line_end):
+                hits.add(category)
+            else:
+                verified.add((category, regex))
+        if len(hits) == len(matcher.categories):
+            break
+    return sorted(hits)
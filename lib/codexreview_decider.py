@@ -1,133 +1,182 @@
 """CodexReview 决策模块：根据状态决定是否运行 review"""
 
-from typing import Dict
+from typing import Callable, Dict, List, Optional
 
-# 阈值配置（硬编码，暂不引入配置系统）
-SCORE_THRESHOLD = 4
+from lib.codexreview_config import band_score, default_config, load_config
 
+SUMMARY_VERSION = 1
 
-def _calculate_score(state: Dict) -> int:
+# 硬触发（按优先级）及其在 prompt 中的说明；content_risk 的说明附带命中类别
+HARD_TRIGGERS = (
+    ("plan_docs", "- 方案/设计文档变更"),
+    ("risk_files", "- 高风险配置/依赖变更"),
+    ("content_risk", "- 新增内容命中风险规则"),
+)
+
+PROMPT_TITLE = "请 review 以下代码变更："
+
+
+def _metrics(pending: Dict) -> Dict:
+    return {
+        "events": pending.get("events", 0),
+        "files": len(pending.get("files", [])),
+        "modules": len(pending.get("modules", [])),
+        "lines_touched_est": pending.get("lines_touched_est", 0),
+    }
+
+
+def _band_scores(pending: Dict, config: Dict) -> Dict:
     """
-    按约定计算灰区评分（分档评分）
+    各指标的分档得分
 
-    评分约定：
+    默认评分约定（可通过配置文件 bands 覆盖）：
     - events: 1-3=0, 4-7=1, 8+=2
     - files: 1=0, 2-3=1, 4+=2
     - modules: 1=0, 2+=1
     - lines: 1-29=0, 30-99=1, 100+=2
     """
-    pending = state.get("pending", {})
-
-    events = pending.get("events", 0)
-    files = len(pending.get("files", []))
-    modules = len(pending.get("modules", []))
+    bands = config["bands"]
     # 优先使用 lines_touched_git，否则退回 lines_touched_est
     lines = pending.get("lines_touched_git")
     if lines is None:
         lines = pending.get("lines_touched_est", 0)
+    return {
+        "events": band_score(pending.get("events", 0), bands["events"]),
+        "files": band_score(len(pending.get("files", [])), bands["files"]),
+        "modules": band_score(len(pending.get("modules", [])), bands["modules"]),
+        "lines": band_score(lines, bands["lines"]),
+    }
+
+
+def summarize(pending: Dict, config: Optional[Dict] = None) -> Dict:
+    """
+    从 pending 计算决策摘要（保存在 pending.summary 中）
+
+    摘要只省去 Stop 时的评分与 prompt 头的重算；它和 files、repos、
+    seen_tool_use_ids 同在一个状态文件里，Stop 仍要解析整个文件。
+
+    Returns:
+        {"version", "fingerprint", "metrics", "bands", "score", "reason", "run", "prompt_header"}；
+        fingerprint 为计算时所用配置的指纹，配置变化后摘要即失效。
+    """
+    if config is None:
+        config = default_config()
+    flags = pending.get("flags", {})
+    bands = _band_scores(pending, config)
+    score = sum(bands.values())
+
+    header: List[str] = [PROMPT_TITLE]
+    reason = None
+    for flag, line in HARD_TRIGGERS:
+        if not flags.get(flag):
+            continue
+        if reason is None:
+            reason = flag
+        if flag == "content_risk":
+            line = f"{line}: {', '.join(pending.get('content_risk_kinds', []))}"
+        header.append(line)
+
+    if reason is None:
+        reason = "score_threshold_met" if score >= config["score_threshold"] else "score_too_low"
+
+    return {
+        "version": SUMMARY_VERSION,
+        "fingerprint": config.get("fingerprint"),
+        "metrics": _metrics(pending),
+        "bands": bands,
+        "score": score,
+        "reason": reason,
+        "run": reason != "score_too_low",
+        "prompt_header": header,
+    }
+
+
+def _decision(summary: Dict) -> Dict:
+    return {
+        "run": summary["run"],
+        "reason": summary["reason"],
+        "score": summary["score"],
+        "metrics": dict(summary["metrics"]),
+        "prompt_header": list(summary["prompt_header"]),
+    }
 
-    # events 分档
-    if events >= 8:
-        events_score = 2
-    elif events >= 4:
-        events_score = 1
-    else:
-        events_score = 0
-
-    # files 分档
-    if files >= 4:
-        files_score = 2
-    elif files >= 2:
-        files_score = 1
-    else:
-        files_score = 0
-
-    # modules 分档
-    if modules >= 2:
-        modules_score = 1
-    else:
-        modules_score = 0
-
-    # lines 分档
-    # Match test expectations: modest changes (>=30 lines) should start contributing.
-    if lines >= 100:
-        lines_score = 2
-    elif lines >= 30:
-        lines_score = 1
-    else:
-        lines_score = 0
-
-    return events_score + files_score + modules_score + lines_score
-
-
-def should_run_review(state: Dict) -> Dict:
+
+def should_run_review(state: Dict, config: Optional[Dict] = None) -> Dict:
     """
-    根据状态决定是否运行 review
+    根据状态决定是否运行 review（总是从 pending 全量计算）
 
     Args:
         state: 状态字典，包含 pending 和 meta 字段
+        config: load_config() 的结果；None 时使用默认配置
 
     Returns:
         决策结果字典，包含：
         - run: bool, 是否运行 review
-        - reason: str, 原因（plan_docs/risk_files/score_threshold）
+        - reason: str, 原因（plan_docs/risk_files/content_risk/score_threshold_met/score_too_low）
         - score: int, 评分
         - metrics: dict, 各项指标
+        - prompt_header: list, prompt 开头的说明行（标题 + 命中的硬触发）
     """
-    pending = state.get("pending", {})
-    flags = pending.get("flags", {})
+    return _decision(summarize(state.get("pending", {}), config))
 
-    # 硬触发：plan_docs
-    if flags.get("plan_docs"):
-        return {
-            "run": True,
-            "reason": "plan_docs",
-            "score": _calculate_score(state),
-            "metrics": {
-                "events": pending.get("events", 0),
-                "files": len(pending.get("files", [])),
-                "modules": len(pending.get("modules", [])),
-                "lines_touched_est": pending.get("lines_touched_est", 0),
-            },
-        }
-
-    # 硬触发：risk_files
-    if flags.get("risk_files"):
-        return {
-            "run": True,
-            "reason": "risk_files",
-            "score": _calculate_score(state),
-            "metrics": {
-                "events": pending.get("events", 0),
-                "files": len(pending.get("files", [])),
-                "modules": len(pending.get("modules", [])),
-                "lines_touched_est": pending.get("lines_touched_est", 0),
-            },
-        }
-
-    # 灰区：按评分决定
-    score = _calculate_score(state)
-    if score >= SCORE_THRESHOLD:
-        return {
-            "run": True,
-            "reason": "score_threshold_met",
-            "score": score,
-            "metrics": {
-                "events": pending.get("events", 0),
-                "files": len(pending.get("files", [])),
-                "modules": len(pending.get("modules", [])),
-                "lines_touched_est": pending.get("lines_touched_est", 0),
-            },
-        }
 
-    return {
-        "run": False,
-        "reason": "score_too_low",
-        "score": score,
-        "metrics": {
-            "events": pending.get("events", 0),
-            "files": len(pending.get("files", [])),
-            "modules": len(pending.get("modules", [])),
-            "lines_touched_est": pending.get("lines_touched_est", 0),
-        },
-    }
\ No newline at end of file
+def cached_decision(state: Dict, config: Optional[Dict] = None) -> Dict:
+    """
+    优先使用 recorder 维护的 pending.summary 作出决策
+
+    摘要缺失、版本不符或配置指纹变化时退回全量计算。
+    """
+    if config is None:
+        config = default_config()
+    summary = state.get("pending", {}).get("summary")
+    if (
+        isinstance(summary, dict)
+        and summary.get("version") == SUMMARY_VERSION
+        and summary.get("fingerprint") == config.get("fingerprint")
+    ):
+        return _decision(summary)
+    return should_run_review(state, config)
+
+
+def decide_repos(buckets: Dict[str, Dict], config_for: Callable[[str], Dict] = load_config) -> Dict[str, Dict]:
+    """
+    对每个仓库分桶分别决策（各自使用该仓库的配置）
+
+    Args:
+        buckets: {仓库根: pending 分桶}，见 codexreview_state.pending_buckets
+        config_for: 仓库根 -> 配置
+
+    Returns:
+        {仓库根: 决策结果}
+    """
+    return {root: cached_decision({"pending": bucket}, config_for(root)) for root, bucket in buckets.items()}
+
+
+def check_summary(state: Dict, cwd: str = "", config_for: Callable[[str], Dict] = load_config) -> Dict[str, List[str]]:
+    """
+    一致性检查：把每个仓库分桶的 summary 与全量重算的结果逐项比较
+
+    Stop 在设置 `CODEXREVIEW_CHECK_SUMMARY=1` 时调用，用于排查 recorder 维护的摘要是否漂移。
+
+    Args:
+        state: 状态字典
+        cwd: session 的 cwd（旧版本状态没有分桶时按 cwd 所在仓库计）
+        config_for: 仓库根 -> 配置
+
+    Returns:
+        {仓库根: 不一致的字段名}，只包含有问题的仓库；分桶没有摘要时为 ["missing"]
+    """
+    # codexreview_state 导入了本模块的 summarize，这里延迟导入以免循环
+    from lib.codexreview_state import pending_buckets
+
+    mismatches = {}
+    for root, bucket in pending_buckets(state, cwd).items():
+        summary = bucket.get("summary")
+        if not isinstance(summary, dict):
+            mismatches[root] = ["missing"]
+            continue
+        expected = summarize(bucket, config_for(root))
+        fields = [key for key in expected if summary.get(key) != expected[key]]
+        if fields:
+            mismatches[root] = fields
+    return mismatches
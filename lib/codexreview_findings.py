@@ -0,0 +1,314 @@
+"""CodexReview findings 索引：解析 agent 输出并按仓库持久化 review 结论"""
+
+from __future__ import annotations
+
+import datetime
+import hashlib
+import json
+import os
+import re
+import uuid
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from lib.codexreview_state import state_dir
+
+INDEX_VERSION = 1
+
+# 已解决的 findings 只保留最近这么多条，防止索引无限增长
+MAX_RESOLVED_FINDINGS = 200
+
+# 形如 `src/a.py:12`、`src/a.py:12-30`、`src/a.py:12:5` 的位置标记
+_LOCATION_RE = re.compile(
+    r"(?P<file>(?:[A-Za-z]:)?[\w./\\@+-]*[\w-]\.[A-Za-z0-9]+):(?P<start>\d+)(?:[-–~](?P<end>\d+))?(?::\d+)?"
+)
+
+_SEVERITY_WORDS = r"P[0-3]|critical|blocker|high|major|medium|moderate|low|minor|info|nit"
+
+# 文本行必须带严重级别标记才算 finding：任意位置的 [P1]/(high)/P1，
+# 或行首（列表符号之后）的 `high:`、`**High**` 等。不带括号的 P0-P3 只认大写，
+# 否则 "between p1 and p2" 之类的变量名也会被当成级别
+_SEVERITY_RE = re.compile(
+    rf"(?i:[\[(](?P<bracketed>{_SEVERITY_WORDS})[\])])"
+    rf"|\b(?P<bare>P[0-3])\b"
+    rf"|(?i:^(?:[-*>]|\d+[.)])?\s*(?:\*\*|__)?(?P<leading>{_SEVERITY_WORDS})(?:\*\*|__)?\s*[:：\-–])"
+)
+
+_SEVERITY_ALIASES = {
+    "p0": "critical",
+    "blocker": "critical",
+    "critical": "critical",
+    "p1": "high",
+    "major": "high",
+    "high": "high",
+    "p2": "medium",
+    "moderate": "medium",
+    "medium": "medium",
+    "p3": "low",
+    "minor": "low",
+    "low": "low",
+    "info": "info",
+    "nit": "info",
+}
+
+
+def _now() -> str:
+    return datetime.datetime.now().isoformat()
+
+
+def findings_index_path(repo_root: str) -> Path:
+    """每个仓库一份索引，按仓库根路径哈希命名"""
+    digest = hashlib.sha1(str(repo_root).encode("utf-8")).hexdigest()[:16]
+    return state_dir() / "findings" / f"{digest}.json"
+
+
+def _empty_index(repo_root: str) -> Dict:
+    return {"version": INDEX_VERSION, "repo_root": str(repo_root), "files": {}, "findings": {}}
+
+
+def load_findings_index(path: str, repo_root: str) -> Dict:
+    p = Path(path)
+    if not p.exists():
+        return _empty_index(repo_root)
+    try:
+        index = json.loads(p.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return _empty_index(repo_root)
+    if not isinstance(index, dict) or index.get("version") != INDEX_VERSION:
+        return _empty_index(repo_root)
+    index.setdefault("files", {})
+    index.setdefault("findings", {})
+    return index
+
+
+def save_findings_index(path: str, index: Dict) -> None:
+    p = Path(path)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    tmp = p.with_name(f"{p.name}.{uuid.uuid4().hex}.tmp")
+    tmp.write_text(json.dumps(index, ensure_ascii=True, indent=2), encoding="utf-8")
+    os.replace(tmp, p)
+
+
+def _rel_key(file_path: str, repo_root: str) -> str:
+    """统一为相对仓库根、以 / 分隔的路径，作为索引里的文件 key"""
+    p = Path(file_path)
+    if not p.is_absolute():
+        p = Path(repo_root) / p
+    try:
+        return Path(os.path.normpath(p)).relative_to(Path(repo_root)).as_posix()
+    except ValueError:
+        return Path(os.path.normpath(p)).as_posix()
+
+
+def _content_sha1(file_path: Path) -> Optional[str]:
+    try:
+        return hashlib.sha1(file_path.read_bytes()).hexdigest()
+    except OSError:
+        return None
+
+
+def fingerprint(file_key: str, message: str) -> str:
+    """
+    finding 指纹：文件 + 归一化后的描述
+
+    归一化时去掉数字与多余空白，使同一问题在行号漂移后仍能对上。
+    指纹依赖描述文本：agent 换一种说法描述同一个仍未修复的问题时，
+    旧指纹会被标记为 resolved、新指纹作为新的 open finding 出现。
+    """
+    normalized = re.sub(r"\d+", "#", message.lower())
+    normalized = " ".join(normalized.split())
+    return hashlib.sha1(f"{file_key}\0{normalized}".encode("utf-8")).hexdigest()[:20]
+
+
+def _finding_from_json(obj: Dict, repo_root: str) -> Optional[Dict]:
+    file_path = obj.get("file") or obj.get("path")
+    if not isinstance(file_path, str) or not file_path:
+        return None
+    start = obj.get("line") or obj.get("line_start") or obj.get("start_line") or 0
+    end = obj.get("line_end") or obj.get("end_line") or start
+    try:
+        start, end = int(start), int(end)
+    except (TypeError, ValueError):
+        start = end = 0
+    severity = str(obj.get("severity") or "").lower()
+    message = str(obj.get("message") or obj.get("title") or obj.get("body") or "").strip()
+    file_key = _rel_key(file_path, repo_root)
+    return {
+        "file": file_key,
+        "line_start": start,
+        "line_end": max(start, end),
+        "severity": _SEVERITY_ALIASES.get(severity, severity or "unknown"),
+        "message": message,
+        "fingerprint": fingerprint(file_key, message),
+    }
+
+
+def _find_location(line: str) -> Optional[re.Match]:
+    """行内第一个不属于 URL 的 `path:line` 位置标记"""
+    for m in _LOCATION_RE.finditer(line):
+        token_start = max(line.rfind(" ", 0, m.start()), line.rfind("\t", 0, m.start())) + 1
+        token_end = m.end()
+        while token_end < len(line) and not line[token_end].isspace():
+            token_end += 1
+        if "://" not in line[token_start:token_end]:
+            return m
+    return None
+
+
+def parse_findings(output: str, repo_root: str) -> List[Dict]:
+    """
+    从 agent 输出中提取结构化 findings
+
+    支持两种形式：
+    - 每行一个 JSON 对象（含 file/line/severity/message 等字段）
+    - 文本行中带 `path:line[-line]` 位置标记，且带严重级别标记（`[P1]`、`P2`、
+      `(high)`，或行首的 `low:`、`**Medium**` 等）；没有严重级别标记的行
+      （例如总结里提到的位置）不算 finding，URL 中的 `host:port` 不算位置
+
+    Returns:
+        findings 列表，每项包含 file、line_start、line_end、severity、message、fingerprint
+    """
+    findings: List[Dict] = []
+    seen = set()
+    for raw in (output or "").splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+
+        finding = None
+        if line.startswith("{"):
+            try:
+                obj = json.loads(line)
+            except ValueError:
+                obj = None
+            if isinstance(obj, dict):
+                finding = _finding_from_json(obj, repo_root)
+        else:
+            sev = _SEVERITY_RE.search(line)
+            m = _find_location(line) if sev else None
+            if m:
+                start = int(m.group("start"))
+                end = int(m.group("end") or start)
+                # 去掉位置与严重级别标记，只保留描述
+                spans = sorted([(m.start(), m.end()), sev.span()])
+                if spans[0][1] <= spans[1][0]:
+                    rest = line[: spans[0][0]] + " " + line[spans[0][1]: spans[1][0]] + " " + line[spans[1][1]:]
+                else:
+                    rest = line[: m.start()] + " " + line[m.end():]
+                message = re.sub(r"\s{2,}", " ", rest).strip(" \t-*:|`>")
+                file_key = _rel_key(m.group("file"), repo_root)
+                word = sev.group("bracketed") or sev.group("bare") or sev.group("leading")
+                finding = {
+                    "file": file_key,
+                    "line_start": start,
+                    "line_end": max(start, end),
+                    "severity": _SEVERITY_ALIASES[word.lower()],
+                    "message": message,
+                    "fingerprint": fingerprint(file_key, message),
+                }
+
+        if finding and finding["fingerprint"] not in seen:
+            seen.add(finding["fingerprint"])
+            findings.append(finding)
+    return findings
+
+
+def update_findings_index(index: Dict, repo_root: str, reviewed_files: Iterable[str], findings: List[Dict]) -> Dict:
+    """
+    用一次成功 review 的结果更新索引
+
+    - 被 review 的文件记录当前内容哈希
+    - 本次报告的 findings 置为 open
+    - 被 review 文件上、此前 open 但本次未再出现的 findings 置为 resolved
+    """
+    now = _now()
+    reviewed = {_rel_key(f, repo_root) for f in reviewed_files}
+    reported = {f["fingerprint"] for f in findings}
+
+    for key in reviewed:
+        index["files"][key] = {
+            "sha1": _content_sha1(Path(repo_root) / key),
+            "reviewed_at": now,
+        }
+
+    for fp, item in index["findings"].items():
+        if item.get("status") == "open" and item.get("file") in reviewed and fp not in reported:
+            item["status"] = "resolved"
+            item["resolved_at"] = now
+
+    for f in findings:
+        item = index["findings"].get(f["fingerprint"])
+        if item is None:
+            item = {"first_seen": now}
+            index["findings"][f["fingerprint"]] = item
+        item.update(
+            {
+                "file": f["file"],
+                "line_start": f["line_start"],
+                "line_end": f["line_end"],
+                "severity": f["severity"],
+                "message": f["message"],
+                "status": "open",
+                "last_seen": now,
+            }
+        )
+        item.pop("resolved_at", None)
+
+    resolved = sorted(
+        (fp for fp, item in index["findings"].items() if item.get("status") == "resolved"),
+        key=lambda fp: index["findings"][fp].get("resolved_at") or "",
+    )
+    for fp in resolved[: max(0, len(resolved) - MAX_RESOLVED_FINDINGS)]:
+        del index["findings"][fp]
+
+    return index
+
+
+def open_findings_for(index: Dict, repo_root: str, files: Iterable[str]) -> List[Dict]:
+    """返回给定文件上仍为 open 的 findings（按文件、行号排序）"""
+    keys = {_rel_key(f, repo_root) for f in files}
+    items = [
+        item for item in index["findings"].values()
+        if item.get("status") == "open" and item.get("file") in keys
+    ]
+    return sorted(items, key=lambda item: (item["file"], item.get("line_start", 0)))
+
+
+def select_files_for_review(index: Dict, repo_root: str, files: Iterable[str]) -> Tuple[List[str], List[str]]:
+    """
+    过滤掉无需再次 review 的文件
+
+    文件满足以下条件时跳过：上次 review 后内容未变化，且其上没有 open findings。
+
+    Returns:
+        (需要 review 的文件, 被跳过的文件)，均保持原有顺序与原始路径
+    """
+    open_files = {item.get("file") for item in index["findings"].values() if item.get("status") == "open"}
+    to_review: List[str] = []
+    skipped: List[str] = []
+    for f in files:
+        key = _rel_key(f, repo_root)
+        record = index["files"].get(key)
+        if (
+            record
+            and key not in open_files
+            and record.get("sha1") is not None
+            and record.get("sha1") == _content_sha1(Path(repo_root) / key)
+        ):
+            skipped.append(f)
+        else:
+            to_review.append(f)
+    return to_review, skipped
+
+
+def format_open_findings(findings: List[Dict], limit: int = 20) -> List[str]:
+    """把 open findings 渲染为 prompt 行"""
+    lines = []
+    for item in findings[:limit]:
+        loc = f"{item['file']}:{item.get('line_start', 0)}"
+        if item.get("line_end") and item.get("line_end") != item.get("line_start"):
+            loc += f"-{item['line_end']}"
+        lines.append(f"  - [{item.get('severity', 'unknown')}] {loc} {item.get('message', '')}".rstrip())
+    if len(findings) > limit:
+        lines.append(f"  - ……另有 {len(findings) - limit} 条")
+    return lines
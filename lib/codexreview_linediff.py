@@ -0,0 +1,114 @@
+"""CodexReview 行数估算：计算 Edit/MultiEdit 的实际变更行数"""
+
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Mapping
+
+# 中间差异段（去掉公共首尾后）超过该行数时不再做逐行比对，退回粗估，
+# 避免超大 old_string/new_string 拖慢 record hook。
+DIFF_MAX_LINES = 20000
+
+
+def count_changed_lines(old: str, new: str, max_lines: int = DIFF_MAX_LINES) -> int:
+    """
+    估算从 old 变为 new 的变更行数（O(n log n)）
+
+    做法：
+    1) 先剥离公共前缀/后缀行（绝大多数 Edit 只改中间一小段）
+    2) 中间段按行内容配对：new 中某行第 k 次出现与 old 中同一行第 k 次出现配对
+    3) 按 new 的顺序取配对行在 old 中的位置，其最长递增子序列即保持相对顺序
+       未动的行；其余配对行视为移动过，同样计入变更
+
+    返回 max(删除行数, 新增行数)，与 git numstat 的 “替换一行记一行” 口径一致。
+    第 2 步的固定配对是为避免二次复杂度的取舍：重复行较多时结果可能略高于
+    真正的最长公共子序列，但不会把调换顺序的行算作未改动。
+
+    Args:
+        old: 原文本
+        new: 新文本
+        max_lines: 中间段行数上限，超过时返回 max(两侧中间段行数)
+
+    Returns:
+        变更行数估算
+    """
+    if old == new:
+        return 0
+
+    a = old.splitlines()
+    b = new.splitlines()
+
+    # 公共前缀
+    n = min(len(a), len(b))
+    head = 0
+    while head < n and a[head] == b[head]:
+        head += 1
+
+    # 公共后缀（不与前缀重叠）
+    tail = 0
+    while tail < n - head and a[-1 - tail] == b[-1 - tail]:
+        tail += 1
+
+    a_mid = a[head:len(a) - tail]
+    b_mid = b[head:len(b) - tail]
+    upper = max(len(a_mid), len(b_mid))
+
+    # 纯插入/纯删除，或中间段过大：无需（或不值得）逐行比对
+    if not a_mid or not b_mid or len(a_mid) + len(b_mid) > max_lines:
+        return upper
+
+    return upper - _stable_lines(a_mid, b_mid)
+
+
+def _stable_lines(a: List[str], b: List[str]) -> int:
+    """b 中按相对顺序与 a 一致的配对行数（配对位置序列的最长递增子序列长度）"""
+    positions: Dict[str, List[int]] = {}
+    for i in range(len(a) - 1, -1, -1):
+        positions.setdefault(a[i], []).append(i)
+
+    # tails[k]：长度为 k+1 的递增子序列的最小结尾位置
+    tails: List[int] = []
+    for line in b:
+        occ = positions.get(line)
+        if not occ:
+            continue
+        pos = occ.pop()
+        k = bisect_left(tails, pos)
+        if k == len(tails):
+            tails.append(pos)
+        else:
+            tails[k] = pos
+    return len(tails)
+
+
+def added_lines(old: str, new: str) -> List[str]:
+    """
+    new 中新增的行（用于只扫描新写入的内容）
+
+    new 的每行与 old 中同一行的某次出现配对（同 count_changed_lines 的配对），
+    配不上的行即新增；只是移动了位置的行内容并不新，不算新增。
+    """
+    if old == new:
+        return []
+    a = old.splitlines()
+    b = new.splitlines()
+    remaining: Dict[str, int] = {}
+    for line in a:
+        remaining[line] = remaining.get(line, 0) + 1
+    added = []
+    for line in b:
+        if remaining.get(line, 0) > 0:
+            remaining[line] -= 1
+        else:
+            added.append(line)
+    return added
+
+
+def count_multiedit_lines(edits: Iterable[Mapping], max_lines: int = DIFF_MAX_LINES) -> int:
+    """估算 MultiEdit 的变更行数：逐个 edit 计算后累加"""
+    total = 0
+    for edit in edits or []:
+        if not isinstance(edit, Mapping):
+            continue
+        total += count_changed_lines(
+            edit.get("old_string") or "", edit.get("new_string") or "", max_lines
+        )
+    return total
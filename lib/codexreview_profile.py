@@ -0,0 +1,187 @@
+"""CodexReview 性能采样：按需对单次 hook 调用做 cProfile/tracemalloc 采样并汇总
+
+cProfile/pstats/tracemalloc 只在开启采样或汇总时才导入：本模块每次 hook 都会加载，
+未开启采样时不应为此多付导入开销。
+
+采样从 hook 入口函数开始，不包含解释器启动与模块导入耗时；对短命的 hook 进程
+这部分往往占大头，需要时用 `python3 -X importtime bin/codexreview-record` 单独查看。
+"""
+
+from __future__ import annotations
+
+import datetime
+import json
+import os
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Mapping, Optional
+
+from lib.codexreview_state import state_dir
+
+# CODEXREVIEW_PROFILE=1|cpu 仅 cProfile；=mem|all 额外开启 tracemalloc
+PROFILE_ENV = "CODEXREVIEW_PROFILE"
+# 采样目录中最多保留的调用次数（超出后删除最旧的）
+PROFILE_KEEP_ENV = "CODEXREVIEW_PROFILE_KEEP"
+DEFAULT_KEEP = 100
+
+_CPU_VALUES = ("1", "true", "yes", "on", "cpu")
+_MEM_VALUES = ("mem", "memory", "all")
+
+
+def profile_dir() -> Path:
+    return state_dir() / "profiles"
+
+
+def _profile_mode(env: Mapping[str, str]) -> Optional[str]:
+    v = (env.get(PROFILE_ENV) or "").strip().lower()
+    if v in _MEM_VALUES:
+        return "mem"
+    if v in _CPU_VALUES:
+        return "cpu"
+    return None
+
+
+def _keep_limit(env: Mapping[str, str]) -> int:
+    try:
+        return max(1, int(env.get(PROFILE_KEEP_ENV, DEFAULT_KEEP)))
+    except ValueError:
+        return DEFAULT_KEEP
+
+
+def _rotate(directory: Path, keep: int) -> None:
+    """文件名以时间戳开头，按名字排序即按时间排序"""
+    runs = sorted(directory.glob("*.prof"))
+    for old in runs[: max(0, len(runs) - keep)]:
+        for p in (old, old.with_suffix(".json")):
+            try:
+                p.unlink()
+            except OSError:
+                pass
+
+
+def run_profiled(hook: str, func: Callable[[], int], env: Mapping[str, str] | None = None) -> int:
+    """
+    运行 hook 入口函数；开启采样时把本次调用的 profile 写入 profile_dir()
+
+    采样失败（例如目录不可写）只会丢掉采样结果，不影响 hook 本身。
+
+    Args:
+        hook: hook 名称（record/stop），写入文件名与元数据
+        func: 入口函数，返回退出码
+        env: 环境变量（默认 os.environ）
+
+    Returns:
+        func 的返回值
+    """
+    if env is None:
+        env = os.environ
+
+    mode = _profile_mode(env)
+    if mode is None:
+        return func()
+
+    import cProfile
+    import tracemalloc
+
+    if mode == "mem":
+        tracemalloc.start()
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    try:
+        return profiler.runcall(func)
+    finally:
+        wall = time.perf_counter() - start
+        meta: Dict = {
+            "hook": hook,
+            "pid": os.getpid(),
+            "started_at": datetime.datetime.now().isoformat(),
+            "wall_ms": wall * 1000,
+        }
+        if mode == "mem":
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            meta["peak_kb"] = peak / 1024
+            meta["top_allocations"] = [
+                {"where": str(stat.traceback), "size_kb": stat.size / 1024, "count": stat.count}
+                for stat in snapshot.statistics("lineno")[:10]
+            ]
+        try:
+            directory = profile_dir()
+            directory.mkdir(parents=True, exist_ok=True)
+            stamp = datetime.datetime.now().strftime("%Y%m%dT%H%M%S%f")
+            base = directory / f"{stamp}-{os.getpid()}-{hook}"
+            profiler.dump_stats(str(base.with_suffix(".prof")))
+            base.with_suffix(".json").write_text(json.dumps(meta, ensure_ascii=True, indent=2), encoding="utf-8")
+            _rotate(directory, _keep_limit(env))
+        except OSError:
+            pass
+
+
+def _func_label(key) -> str:
+    filename, line, name = key
+    if filename == "~":
+        return name
+    return f"{Path(filename).name}:{line}({name})"
+
+
+def aggregate_profiles(directory: Path, hook: Optional[str] = None, top: int = 20, sort: str = "cumulative") -> Dict:
+    """
+    汇总目录下的多次采样
+
+    Args:
+        directory: 采样目录
+        hook: 只汇总指定 hook（record/stop），None 表示全部
+        top: 热点函数条数
+        sort: cumulative 或 tottime
+
+    Returns:
+        {"runs": int, "hooks": {hook: {runs, wall_ms_avg, wall_ms_max, peak_kb_max}}, "functions": [...]}
+    """
+    profs = sorted(directory.glob("*.prof")) if directory.exists() else []
+    if hook:
+        profs = [p for p in profs if p.stem.endswith(f"-{hook}")]
+
+    hooks: Dict[str, Dict] = {}
+    for p in profs:
+        try:
+            meta = json.loads(p.with_suffix(".json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        h = hooks.setdefault(meta.get("hook", "?"), {"runs": 0, "wall_ms": [], "peak_kb": []})
+        h["runs"] += 1
+        h["wall_ms"].append(meta.get("wall_ms", 0.0))
+        if "peak_kb" in meta:
+            h["peak_kb"].append(meta["peak_kb"])
+
+    summary = {
+        name: {
+            "runs": h["runs"],
+            "wall_ms_avg": sum(h["wall_ms"]) / len(h["wall_ms"]) if h["wall_ms"] else 0.0,
+            "wall_ms_max": max(h["wall_ms"], default=0.0),
+            "peak_kb_max": max(h["peak_kb"], default=None),
+        }
+        for name, h in sorted(hooks.items())
+    }
+
+    functions: List[Dict] = []
+    if profs:
+        import pstats
+
+        stats = pstats.Stats(str(profs[0]))
+        for p in profs[1:]:
+            stats.add(str(p))
+        index = 3 if sort == "cumulative" else 2
+        rows = sorted(stats.stats.items(), key=lambda kv: kv[1][index], reverse=True)
+        for key, (_cc, nc, tt, ct, _callers) in rows[:top]:
+            functions.append(
+                {
+                    "function": _func_label(key),
+                    "ncalls": nc,
+                    "tottime_ms": tt * 1000,
+                    "cumtime_ms": ct * 1000,
+                    "cumtime_ms_per_run": ct * 1000 / len(profs),
+                }
+            )
+
+    return {"runs": len(profs), "hooks": summary, "functions": functions}
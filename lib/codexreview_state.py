@@ -1,8 +1,26 @@
 import copy
 import json
 import os
+import time
 import uuid
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+from lib.codexreview_config import default_config, load_config
+from lib.codexreview_ignore import get_matcher, ignore_globs_from_env
+from lib.codexreview_content_risk import load_content_patterns, scan_content
+from lib.codexreview_decider import summarize
+from lib.codexreview_linediff import added_lines, count_changed_lines, count_multiedit_lines
 
 DEFAULT_STATE = {
     "pending": {
@@ -13,10 +31,54 @@ DEFAULT_STATE = {
         "lines_touched_git": None,
         "flags": {"plan_docs": False, "risk_files": False},
     },
-    "meta": {"last_review_at": None},
+    # transcript_offset 从 0 开始：首次记账之前漏记的调用也能被 Stop 补账（靠 tool_use_id 去重）；
+    # 没有该字段的状态文件来自旧版本，见 codexreview_transcript.reconcile_transcript
+    "meta": {"last_review_at": None, "transcript_offset": 0},
 }
 
 
+def state_dir() -> Path:
+    """所有 session 状态文件及缓存的根目录"""
+    return Path.home() / ".claude" / "state" / "codexreview"
+
+
+# 目录 -> 所在 git 仓库根（None 表示不在仓库内）；进程内缓存，watcher/补账批量处理时免去重复向上查找
+_GIT_ROOTS: Dict[str, Optional[str]] = {}
+
+
+def git_root_for_dir(directory: str) -> Optional[str]:
+    """目录所在 git 仓库的根（按目录缓存）；不在任何仓库内时返回 None"""
+    key = os.path.abspath(directory or ".")
+    if key in _GIT_ROOTS:
+        return _GIT_ROOTS[key]
+    start = Path(key).resolve()
+    walked = [key]
+    root = None
+    for candidate in (start, *start.parents):
+        c = str(candidate)
+        if c in _GIT_ROOTS:
+            root = _GIT_ROOTS[c]
+            break
+        walked.append(c)
+        if (candidate / ".git").exists():
+            root = c
+            break
+    for c in walked:
+        _GIT_ROOTS[c] = root
+    return root
+
+
+def bucket_root(file_path: str, cwd: str) -> str:
+    """文件计入哪个仓库的 pending：文件所在 git 仓库；不在仓库内时归入 cwd 所在仓库"""
+    directory = os.path.dirname(os.path.abspath(file_path))
+    root = git_root_for_dir(directory)
+    if root is not None:
+        return root
+    # 文件不在仓库内：归入 cwd 所在仓库，cwd 也不在仓库内时归入 cwd 本身
+    fallback = cwd or directory
+    return git_root_for_dir(fallback) or str(Path(fallback).resolve())
+
+
 def load_state(path: str) -> dict:
     p = Path(path)
     if not p.exists():
@@ -34,6 +96,33 @@ def save_state(path: str, state: dict) -> None:
     os.replace(tmp, p)
 
 
+@contextmanager
+def state_lock(path: str) -> Iterator[None]:
+    """
+    串行化对同一状态文件的读-改-写
+
+    record hook、watcher、transcript 补账与 Stop 分属不同进程（Stop 内各仓库的
+    review 还是不同线程），都在 `<状态文件>.lock` 上加排他锁后再 load/save；
+    每次加锁都新开一个文件描述符，因此同一进程内的线程之间同样互斥。
+    """
+    lock_path = f"{path}.lock"
+    os.makedirs(os.path.dirname(os.path.abspath(lock_path)), exist_ok=True)
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        elif msvcrt is not None:
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is None and msvcrt is not None:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    finally:
+        os.close(fd)
+
+
 def _count_lines(s: str) -> int:
     if not s:
         return 0
@@ -59,84 +148,309 @@ def _module_key(file_path: str, cwd: str) -> str:
     return ""
 
 
-def _is_plan_doc(file_path: str) -> bool:
-    from pathlib import Path
+def _is_plan_doc(file_path: str, config: Optional[dict] = None) -> bool:
+    if config is None:
+        config = default_config()
     p = Path(file_path)
-    path_str = str(p)
-    basename = p.name.lower()
+    path_str = p.as_posix()
     stem = p.stem.lower()
 
-    # Path contains docs/plans/
-    if "docs/plans/" in path_str or "/docs/plans/" in path_str:
-        return True
+    # Path contains docs/plans/ (or another configured plan dir)
+    for d in config["plan_dirs"]:
+        if d in path_str:
+            return True
 
     # Filename contains keywords and extension is .md
-    keywords = ["design", "spec", "requirement", "implementation", "proposal", "adr", "rfc"]
-    if p.suffix.lower() == ".md":
-        for kw in keywords:
+    if p.suffix.lower() in config["plan_extensions"]:
+        for kw in config["plan_keywords"]:
             if kw in stem:
                 return True
 
     return False
 
 
-def _is_risk_file(file_path: str) -> bool:
-    from pathlib import Path
+def _is_risk_file(file_path: str, config: Optional[dict] = None) -> bool:
+    if config is None:
+        config = default_config()
     p = Path(file_path)
-    path_str = str(p)
+    path_str = p.as_posix()
     basename = p.name.lower()
 
-    # basename is package.json
-    if basename == "package.json":
+    # basename is package.json / Dockerfile
+    if basename in config["risk_basenames"]:
         return True
 
     # basename contains lock
-    if "lock" in basename:
-        return True
+    for kw in config["risk_name_keywords"]:
+        if kw in basename:
+            return True
 
     # path contains .github/workflows/
-    if ".github/workflows/" in path_str or "/.github/workflows/" in path_str:
-        return True
-
-    # basename is Dockerfile
-    if basename == "dockerfile":
-        return True
+    for d in config["risk_dirs"]:
+        if d in path_str:
+            return True
 
     return False
 
 
-def update_state_from_post_tool_use(event: dict, state_path: str, write_cap: int = 200) -> None:
-    st = load_state(state_path)
-    tool = event.get("tool_name")
-    tool_input = event.get("tool_input") or {}
-    file_path = tool_input.get("file_path")
-    cwd = event.get("cwd") or ""
-
-    if tool not in ("Edit", "Write") or not file_path:
-        return
+def is_ignored_path(file_path: str, config: Optional[dict] = None, repo_root: Optional[str] = None) -> bool:
+    """文件是否被 .gitignore 层级或用户配置的 ignore glob 排除（不计入 pending）"""
+    if config is None:
+        config = default_config()
+    if repo_root is None:
+        directory = os.path.dirname(os.path.abspath(file_path))
+        repo_root = git_root_for_dir(directory) or str(Path(directory).resolve())
+    globs = tuple(config["ignore_globs"]) + ignore_globs_from_env()
+    return get_matcher(repo_root, globs).is_ignored(file_path)
 
-    st["pending"]["events"] += 1
 
-    if file_path not in st["pending"]["files"]:
-        st["pending"]["files"].append(file_path)
+def _record_file(pending: dict, file_path: str, cwd: str, config: Optional[dict] = None) -> bool:
+    """把文件计入 files/modules/flags；返回该文件此前是否未在 pending 中"""
+    is_new = file_path not in pending["files"]
+    if is_new:
+        pending["files"].append(file_path)
 
     mk = _module_key(file_path, cwd)
-    if mk and mk not in st["pending"]["modules"]:
-        st["pending"]["modules"].append(mk)
+    if mk and mk not in pending["modules"]:
+        pending["modules"].append(mk)
 
+    # Set flags based on file path
+    if _is_plan_doc(file_path, config):
+        pending["flags"]["plan_docs"] = True
+    if _is_risk_file(file_path, config):
+        pending["flags"]["risk_files"] = True
+
+    return is_new
+
+
+def _added_texts(tool: str, tool_input: dict) -> list:
+    """本次工具调用新写入的文本（用于内容风险扫描）；Edit/MultiEdit 只取 new_string 中新增的行"""
+    if tool == "Write":
+        return [tool_input.get("content") or ""]
     if tool == "Edit":
-        old_s = tool_input.get("old_string", "")
-        new_s = tool_input.get("new_string", "")
-        st["pending"]["lines_touched_est"] += max(_count_lines(old_s), _count_lines(new_s))
+        edits = [tool_input]
+    elif tool == "MultiEdit":
+        edits = [e for e in tool_input.get("edits") or [] if isinstance(e, dict)]
+    else:
+        return []
+    return ["\n".join(added_lines(e.get("old_string") or "", e.get("new_string") or "")) for e in edits]
+
+
+RECORDED_TOOLS = ("Edit", "MultiEdit", "Write")
+
+# meta.seen_tool_use_ids 最多保留的条数（只需覆盖 transcript 补账窗口内的调用）
+MAX_SEEN_TOOL_USE_IDS = 1000
+
+# watcher 先于 PostToolUse hook 记下 Edit/Write 自身的落盘时，hook 在这么多秒内
+# 认领该次记账而不再另计一次 event（覆盖 watcher 的去抖上限与 hook 的启动延迟）
+EXTERNAL_CLAIM_WINDOW = 30.0
+
+
+def _claim_external(st: dict, file_path: str) -> bool:
+    """文件是否刚由 watcher 计入过（是则移除该记录，由调用方不再重复计 event）"""
+    external = st.get("meta", {}).get("external_files")
+    if not external:
+        return False
+    recorded_at = external.pop(file_path, None)
+    return recorded_at is not None and time.time() - recorded_at <= EXTERNAL_CLAIM_WINDOW
+
+
+def apply_tool_use(
+    st: dict, tool: str, tool_input: dict, cwd: str, write_cap: Optional[int] = None, config: Optional[dict] = None
+) -> bool:
+    """
+    把一次 Edit/MultiEdit/Write 调用计入 st["pending"]（不读写状态文件）
+
+    Returns:
+        是否计入（非记账工具、缺少 file_path 或路径被忽略时为 False）
+    """
+    file_path = tool_input.get("file_path")
+    if tool not in RECORDED_TOOLS or not file_path:
+        return False
+
+    root = bucket_root(file_path, cwd)
+    if config is None:
+        config = load_config(root)
+    if write_cap is None:
+        write_cap = config["write_cap"]
+
+    # 生成物/第三方文件（git-ignored 或命中用户 ignore glob）不计入
+    if is_ignored_path(file_path, config, root):
+        return False
+
+    lines = 0
+    if tool == "Edit":
+        old_s = tool_input.get("old_string") or ""
+        new_s = tool_input.get("new_string") or ""
+        lines = count_changed_lines(old_s, new_s)
+
+    if tool == "MultiEdit":
+        lines = count_multiedit_lines(tool_input.get("edits") or [])
 
     if tool == "Write":
         content = tool_input.get("content", "")
-        st["pending"]["lines_touched_est"] += min(_count_lines(content), int(write_cap))
+        lines = min(_count_lines(content), int(write_cap))
+
+    # Scan added content for risky patterns (secrets, shell calls, raw SQL, auth bypass)
+    kinds = set()
+    patterns = load_content_patterns(overrides=config["content_patterns"])
+    for text in _added_texts(tool, tool_input):
+        kinds.update(scan_content(text, patterns))
+
+    # 会话汇总与所属仓库的分桶同步累加
+    claimed = _claim_external(st, file_path)
+    bucket = repo_bucket(st["pending"], root, cwd)
+    for pending in (st["pending"], bucket):
+        if not claimed:
+            pending["events"] += 1
+        _record_file(pending, file_path, root, config)
+        pending["lines_touched_est"] += lines
+        if kinds:
+            pending["flags"]["content_risk"] = True
+            known = pending.setdefault("content_risk_kinds", [])
+            known.extend(sorted(kinds - set(known)))
+
+    refresh_summary(bucket, config)
+    return True
+
+
+def repo_bucket(pending: dict, repo_root: str, cwd: str = "") -> dict:
+    """
+    pending.repos 中该仓库的分桶（字段同 DEFAULT_STATE["pending"]），不存在时创建
+
+    旧版本写入的状态没有 repos：首次创建时把已有的 pending 整体作为 cwd 所在
+    仓库的分桶，避免升级后这些未 review 的改动被丢弃。
+    """
+    if "repos" not in pending:
+        repos = {}
+        if pending.get("events", 0) > 0:
+            legacy = {k: copy.deepcopy(v) for k, v in pending.items() if k != "summary"}
+            repos[git_root_for_dir(cwd) or str(Path(cwd or ".").resolve())] = legacy
+        pending["repos"] = repos
+    repos = pending["repos"]
+    if repo_root not in repos:
+        repos[repo_root] = copy.deepcopy(DEFAULT_STATE["pending"])
+    return repos[repo_root]
+
+
+def pending_buckets(state: dict, cwd: str) -> Dict[str, dict]:
+    """
+    有待 review 变更的仓库分桶 {仓库根: 分桶}
+
+    旧版本写入的状态没有 repos，整个 pending 视为 cwd 所在仓库的一个分桶。
+    """
+    pending = state.get("pending", {})
+    if "repos" not in pending:
+        if pending.get("events", 0) == 0:
+            return {}
+        return {git_root_for_dir(cwd) or str(Path(cwd or ".").resolve()): pending}
+    return {root: b for root, b in pending["repos"].items() if b.get("events", 0) > 0}
+
+
+def drop_repo_bucket(pending: dict, repo_root: str) -> None:
+    """移除一个仓库的分桶，并由剩余分桶重建会话汇总"""
+    repos = pending.get("repos", {})
+    repos.pop(repo_root, None)
+    rebuilt = copy.deepcopy(DEFAULT_STATE["pending"])
+    for bucket in repos.values():
+        rebuilt["events"] += bucket.get("events", 0)
+        rebuilt["lines_touched_est"] += bucket.get("lines_touched_est", 0)
+        for key in ("files", "modules"):
+            rebuilt[key].extend(v for v in bucket.get(key, []) if v not in rebuilt[key])
+        for flag, value in bucket.get("flags", {}).items():
+            if value:
+                rebuilt["flags"][flag] = True
+        kinds = bucket.get("content_risk_kinds")
+        if kinds:
+            known = rebuilt.setdefault("content_risk_kinds", [])
+            known.extend(k for k in kinds if k not in known)
+    pending.clear()
+    pending.update(rebuilt)
+    pending["repos"] = repos
+
+
+def refresh_summary(pending: dict, config: Optional[dict] = None) -> None:
+    """pending 变化后重算决策摘要，Stop 直接读取而无需重新评估整个 pending"""
+    pending["summary"] = summarize(pending, config)
+
+
+def mark_tool_use_seen(st: dict, tool_use_id: Optional[str]) -> None:
+    """记录已计入的 tool_use_id，供 transcript 补账去重"""
+    if not tool_use_id:
+        return
+    seen = st.setdefault("meta", {}).setdefault("seen_tool_use_ids", [])
+    if tool_use_id not in seen:
+        seen.append(tool_use_id)
+        del seen[:-MAX_SEEN_TOOL_USE_IDS]
 
-    # Set flags based on file path
-    if _is_plan_doc(file_path):
-        st["pending"]["flags"]["plan_docs"] = True
-    if _is_risk_file(file_path):
-        st["pending"]["flags"]["risk_files"] = True
 
-    save_state(state_path, st)
\ No newline at end of file
+def update_state_from_post_tool_use(
+    event: dict, state_path: str, write_cap: Optional[int] = None, config: Optional[dict] = None
+) -> None:
+    tool = event.get("tool_name")
+    tool_input = event.get("tool_input") or {}
+    if tool not in RECORDED_TOOLS or not tool_input.get("file_path"):
+        return
+
+    with state_lock(state_path):
+        st = load_state(state_path)
+        if not apply_tool_use(st, tool, tool_input, event.get("cwd") or "", write_cap, config):
+            return
+        mark_tool_use_seen(st, event.get("tool_use_id"))
+
+        # 旧版本写入的状态（没有 transcript_offset）中已有不带 tool_use_id 的记账，
+        # 把补账起点设为当前末尾以免重复计入；新状态的起点为 0，由 Stop 从头补账
+        transcript_path = event.get("transcript_path")
+        meta = st.setdefault("meta", {})
+        if transcript_path and meta.get("transcript_offset") is None:
+            try:
+                meta["transcript_offset"] = os.path.getsize(transcript_path)
+                meta["transcript_path"] = transcript_path
+            except OSError:
+                pass
+
+        save_state(state_path, st)
+
+
+def record_external_changes(state_path: str, cwd: str, paths: list, config: Optional[dict] = None) -> int:
+    """
+    记录绕过 Edit/Write 的文件变更（由 watcher 批量上报）
+
+    一批变更中只要有此前未在 pending 中的文件，就计为一次 event；已在 pending
+    中的文件（通常是 Edit/Write 自身落盘触发的）不重复计数。新计入的文件记在
+    meta.external_files 中：若随后到达的 PostToolUse hook 正是这次写入的来源，
+    hook 认领该 event 而不再另计一次。外部变更拿不到变更内容，因此不累加
+    lines_touched_est。
+
+    Returns:
+        新计入的文件数
+    """
+    with state_lock(state_path):
+        st = load_state(state_path)
+        new_files = []
+        touched: Dict[str, dict] = {}
+        for file_path in paths:
+            root = bucket_root(file_path, cwd)
+            file_config = config if config is not None else load_config(root)
+            if is_ignored_path(file_path, file_config, root):
+                continue
+            bucket = repo_bucket(st["pending"], root, cwd)
+            _record_file(bucket, file_path, root, file_config)
+            if _record_file(st["pending"], file_path, root, file_config):
+                new_files.append(file_path)
+                touched[root] = file_config
+        if new_files:
+            now = time.time()
+            external = st.setdefault("meta", {}).setdefault("external_files", {})
+            for path, recorded_at in list(external.items()):
+                if now - recorded_at > EXTERNAL_CLAIM_WINDOW:
+                    del external[path]
+            external.update((path, now) for path in new_files)
+            st["pending"]["events"] += 1
+            # 每个有新文件的仓库各计一次 event
+            for root, file_config in touched.items():
+                bucket = st["pending"]["repos"][root]
+                bucket["events"] += 1
+                refresh_summary(bucket, file_config)
+            save_state(state_path, st)
+    return len(new_files)
@@ -1,13 +1,49 @@
 """CodexReview Stop Runner：执行 review agent 的运行器"""
 
+import copy
 import datetime
 import subprocess
-from typing import Dict
+from typing import Dict, List, Optional
 
-from lib.codexreview_state import DEFAULT_STATE, load_state, save_state
+from lib.codexreview_findings import (
+    load_findings_index,
+    parse_findings,
+    save_findings_index,
+    update_findings_index,
+)
+from lib.codexreview_state import DEFAULT_STATE, drop_repo_bucket, load_state, save_state, state_lock
 
 
-def run_review_if_needed(state_path: str, cwd: str, agent_cmd: list, prompt: str) -> Dict:
+def clear_pending(state_path: str, reviewed: bool = True, repo_root: Optional[str] = None) -> None:
+    """
+    清空 pending
+
+    Args:
+        state_path: 状态文件路径
+        reviewed: 是否确实跑过 review（是则同时更新 meta.last_review_at）
+        repo_root: 只清空该仓库的分桶；None（或状态没有分桶）时清空全部
+    """
+    with state_lock(state_path):
+        state = load_state(state_path)
+        if repo_root is not None and "repos" in state["pending"]:
+            drop_repo_bucket(state["pending"], repo_root)
+        else:
+            # 保持与 DEFAULT_STATE 的字段一致，避免后续读取出现字段缺失/口径不一致
+            state["pending"] = copy.deepcopy(DEFAULT_STATE["pending"])
+        if reviewed:
+            state.setdefault("meta", {})["last_review_at"] = datetime.datetime.now().isoformat()
+        save_state(state_path, state)
+
+
+def run_review_if_needed(
+    state_path: str,
+    cwd: str,
+    agent_cmd: list,
+    prompt: str,
+    findings_path: Optional[str] = None,
+    repo_root: Optional[str] = None,
+    reviewed_files: Optional[List[str]] = None,
+) -> Dict:
     """
     执行 review agent，并根据结果更新状态
 
@@ -16,22 +52,33 @@ def run_review_if_needed(state_path: str, cwd: str, agent_cmd: list, prompt: str
         cwd: 工作目录
         agent_cmd: agent 命令列表
         prompt: 传递给 agent 的输入
+        findings_path: findings 索引路径；提供时成功后解析 agent 输出并写入索引
+        repo_root: 仓库根目录（findings 的文件 key 以此为基准，默认 cwd；成功后只清空该仓库的分桶）
+        reviewed_files: 本次 review 覆盖的文件
 
     Returns:
         结果字典，包含：
         - success: bool, 是否成功
         - returncode: int, 子进程返回码
+        - findings: int, 本次解析出的 findings 数（仅在提供 findings_path 时存在）
     """
     result = subprocess.run(
         agent_cmd, input=prompt, text=True, cwd=cwd, capture_output=True
     )
 
+    out = {"success": result.returncode == 0, "returncode": result.returncode}
+
     if result.returncode == 0:
-        # 成功：清空 pending，更新 last_review_at
-        state = load_state(state_path)
-        # 保持与 DEFAULT_STATE 的字段一致，避免后续读取出现字段缺失/口径不一致
-        state["pending"] = dict(DEFAULT_STATE["pending"])
-        state["meta"]["last_review_at"] = datetime.datetime.now().isoformat()
-        save_state(state_path, state)
+        # 成功：清空 pending（指定 repo_root 时只清空该仓库），更新 last_review_at
+        clear_pending(state_path, repo_root=repo_root)
+
+        if findings_path:
+            root = repo_root or cwd
+            stdout = result.stdout if isinstance(result.stdout, str) else ""
+            findings = parse_findings(stdout, root)
+            index = load_findings_index(findings_path, root)
+            update_findings_index(index, root, reviewed_files or [], findings)
+            save_findings_index(findings_path, index)
+            out["findings"] = len(findings)
 
-    return {"success": result.returncode == 0, "returncode": result.returncode}
+    return out
@@ -0,0 +1,168 @@
+"""CodexReview transcript 补账：从 session transcript 中找回 record hook 漏记的 Edit/Write
+
+record hook 崩溃、超时或被临时禁用时，对应的改动不会进入 pending。Stop 前从
+state 中记录的字节偏移继续读取 transcript（JSONL），把成功执行、但 tool_use_id
+不在 meta.seen_tool_use_ids 中的 Edit/MultiEdit/Write 补计入 pending。
+
+每次只读取偏移之后新增的字节（按块读取），且只对包含 tool_use 的行做 JSON 解析，
+因此 Stop 的开销与本轮新增的 transcript 大小成正比，而不是整个文件。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from lib.codexreview_state import (
+    RECORDED_TOOLS,
+    apply_tool_use,
+    load_state,
+    mark_tool_use_seen,
+    save_state,
+    state_lock,
+)
+
+CHUNK_SIZE = 1 << 20
+# 结果尚未写入的 tool_use 会让偏移停在其所在行；超出该距离后不再等待（视为中断）
+MAX_HOLDBACK = 4 << 20
+
+# "tool_use" 同时是 tool_result 中 "tool_use_id" 的前缀，一次子串判断即可筛掉其余行
+_PREFILTER = b'"tool_use'
+
+
+def _iter_lines(path: str, offset: int, chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[int, int, bytes]]:
+    """
+    从 offset 开始按块读取，逐行产出 (行首偏移, 行尾偏移, 行内容)
+
+    只产出以换行结尾的完整行；末尾未写完的半行留给下一次读取。
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        pos = offset
+        buf = b""
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            buf += chunk
+            start = 0
+            while True:
+                nl = buf.find(b"\n", start)
+                if nl < 0:
+                    break
+                yield pos + start, pos + nl + 1, buf[start:nl]
+                start = nl + 1
+            pos += start
+            buf = buf[start:]
+
+
+def _content_items(record: Dict) -> List[Dict]:
+    message = record.get("message")
+    if not isinstance(message, dict):
+        return []
+    content = message.get("content")
+    if not isinstance(content, list):
+        return []
+    return [c for c in content if isinstance(c, dict)]
+
+
+def scan_transcript(path: str, offset: int, seen: set) -> Tuple[List[Dict], int]:
+    """
+    扫描 transcript 中 offset 之后的内容
+
+    Args:
+        path: transcript 路径
+        offset: 起始字节偏移（必须位于行首）
+        seen: 已计入的 tool_use_id
+
+    Returns:
+        (tool_uses, new_offset)：tool_uses 为结果成功、且不在 seen 中的
+        Edit/MultiEdit/Write 调用（{"id", "name", "input", "cwd"}，按出现顺序）；
+        new_offset 为下次扫描的起点——若仍有调用在等待结果，停在最早一条所在行。
+    """
+    uses: Dict[str, Tuple[int, Dict]] = {}
+    done: List[Dict] = []
+    end = offset
+    for line_start, line_end, line in _iter_lines(path, offset):
+        end = line_end
+        if _PREFILTER not in line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if not isinstance(record, dict):
+            continue
+        for item in _content_items(record):
+            kind = item.get("type")
+            if kind == "tool_use":
+                tool_id = item.get("id")
+                if tool_id and tool_id not in seen and item.get("name") in RECORDED_TOOLS:
+                    uses[tool_id] = (
+                        line_start,
+                        {
+                            "id": tool_id,
+                            "name": item["name"],
+                            "input": item.get("input") if isinstance(item.get("input"), dict) else {},
+                            "cwd": record.get("cwd") or "",
+                        },
+                    )
+            elif kind == "tool_result":
+                pending = uses.pop(item.get("tool_use_id"), None)
+                if pending is not None and not item.get("is_error"):
+                    done.append(pending[1])
+
+    waiting = [line_start for line_start, _ in uses.values() if end - line_start <= MAX_HOLDBACK]
+    new_offset = min(waiting) if waiting else end
+    return done, new_offset
+
+
+def reconcile_transcript(state_path: str, transcript_path: Optional[str], cwd: str = "") -> int:
+    """
+    把 transcript 中漏记的 Edit/MultiEdit/Write 补计入 pending
+
+    起点：state 中的 meta.transcript_offset（新状态为 0，即首次从头扫描）；没有该
+    字段的是旧版本写入的状态，其中的记账不带 tool_use_id，从当前末尾开始以免重复。
+    transcript 变短或换了文件时从头扫描，依靠 tool_use_id 去重。
+
+    Returns:
+        补计入的调用数
+    """
+    if not transcript_path:
+        return 0
+    try:
+        size = os.path.getsize(transcript_path)
+    except OSError:
+        return 0
+
+    with state_lock(state_path):
+        st = load_state(state_path)
+        meta = st.setdefault("meta", {})
+        offset = meta.get("transcript_offset")
+        if meta.get("transcript_path") not in (None, transcript_path):
+            offset = 0
+        elif offset is None:
+            offset = size if os.path.exists(state_path) else 0
+        elif offset > size:
+            offset = 0
+
+        if offset == size and meta.get("transcript_path") == transcript_path:
+            return 0
+
+        seen = set(meta.get("seen_tool_use_ids") or [])
+        try:
+            tool_uses, new_offset = scan_transcript(transcript_path, offset, seen)
+        except OSError:
+            return 0
+
+        added = 0
+        for use in tool_uses:
+            if apply_tool_use(st, use["name"], use["input"], use["cwd"] or cwd):
+                added += 1
+            mark_tool_use_seen(st, use["id"])
+
+        meta["transcript_path"] = transcript_path
+        meta["transcript_offset"] = new_offset
+        save_state(state_path, st)
+    return added
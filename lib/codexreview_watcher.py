@@ -0,0 +1,418 @@
+"""CodexReview 变更监听（仅 Linux）：用 inotify 捕获绕过 Edit/Write 的文件变更
+
+Bash 中的 sed、代码生成、格式化、`git checkout` 等改动不会触发 PostToolUse，
+watcher 以 session 的 cwd 为根递归监听，把去抖后的变更批量计入 pending。
+"""
+
+from __future__ import annotations
+
+import errno
+import hashlib
+import os
+import select
+import struct
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+try:
+    import fcntl
+except ImportError:  # 非 Linux 上 record hook 同样会导入本模块
+    fcntl = None
+
+from lib.codexreview_config import load_config
+from lib.codexreview_ignore import get_matcher, ignore_globs_from_env
+from lib.codexreview_state import git_root_for_dir, record_external_changes, state_dir
+
+# 开启后 record hook 会为当前 session 的 cwd 拉起 watcher
+WATCH_ENV = "CODEXREVIEW_WATCH"
+
+# inotify 常量（linux/inotify.h）
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_EXCL_UNLINK = 0x04000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+
+WATCH_MASK = (
+    IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    | IN_DELETE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW | IN_EXCL_UNLINK
+)
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+# 不下钻的目录：版本库元数据、依赖与缓存目录（体量大且不是手写代码）
+DEFAULT_IGNORE_DIRS = frozenset(
+    {
+        ".git", ".hg", ".svn", "node_modules", "__pycache__", ".venv", "venv",
+        ".tox", ".nox", ".mypy_cache", ".pytest_cache", ".ruff_cache", ".idea", ".cache",
+    }
+)
+
+# 编辑器/原子写产生的临时文件
+_IGNORE_FILE_SUFFIXES = (".swp", ".swx", ".swo", ".tmp", "~")
+_IGNORE_FILE_NAMES = frozenset({"4913", ".DS_Store"})
+
+DEFAULT_DEBOUNCE = 0.5
+DEFAULT_MAX_DELAY = 5.0
+DEFAULT_IDLE_TIMEOUT = 3600.0
+
+
+def parse_events(buf: bytes) -> List[Tuple[int, int, int, str]]:
+    """把 read(inotify_fd) 的原始字节解析为 (wd, mask, cookie, name) 列表"""
+    events = []
+    offset = 0
+    size = _EVENT_HEADER.size
+    while offset + size <= len(buf):
+        wd, mask, cookie, length = _EVENT_HEADER.unpack_from(buf, offset)
+        raw = buf[offset + size: offset + size + length]
+        name = os.fsdecode(raw.split(b"\0", 1)[0])
+        events.append((wd, mask, cookie, name))
+        offset += size + length
+    return events
+
+
+def default_ignore_file(name: str) -> bool:
+    return (
+        name in _IGNORE_FILE_NAMES
+        or name.endswith(_IGNORE_FILE_SUFFIXES)
+        or name.startswith(".#")
+    )
+
+
+class InotifyWatcher:
+    """
+    递归 inotify 监听
+
+    inotify 本身不递归：启动时遍历目录树为每个目录添加 watch，之后在目录
+    创建/移入时补充 watch。watch 数达到 `fs.inotify.max_user_watches` 时停止
+    补充并记录 `exhausted`，已添加的 watch 仍然有效。
+    """
+
+    def __init__(self, ignore_dir: Optional[Callable[[str, str], bool]] = None):
+        # ctypes 延迟导入：record hook 只会用到 ensure_watcher，不必为它付导入开销
+        import ctypes
+
+        self._get_errno = ctypes.get_errno
+        # CDLL(None) 取当前进程已加载的符号（含 libc），避免 find_library 拉起子进程
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        self._libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_init1: {os.strerror(err)}")
+        self.fd = fd
+        self._ignore_dir = ignore_dir
+        self.wd_to_dir: Dict[int, str] = {}
+        self.exhausted = False
+        self.overflowed = False
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+    def __enter__(self) -> "InotifyWatcher":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _skip_dir(self, parent: str, name: str) -> bool:
+        if name in DEFAULT_IGNORE_DIRS:
+            return True
+        return bool(self._ignore_dir and self._ignore_dir(parent, name))
+
+    def _add_watch(self, path: str) -> Optional[int]:
+        if self.exhausted:
+            return None
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = self._get_errno()
+            if err == errno.ENOSPC:
+                self.exhausted = True
+            return None
+        self.wd_to_dir[wd] = path
+        return wd
+
+    def add_tree(self, root: str, collect_files: bool = True) -> List[str]:
+        """
+        为 root 及其子目录添加 watch（迭代遍历，不跟随符号链接）
+
+        Returns:
+            collect_files 为 True 时，返回遍历过程中看到的普通文件
+            （用于补报在 watch 生效前就已写入新目录的文件）
+        """
+        files: List[str] = []
+        stack = [root]
+        while stack:
+            current = stack.pop()
+            if self._add_watch(current) is None:
+                continue
+            try:
+                with os.scandir(current) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if not self._skip_dir(current, entry.name):
+                                    stack.append(entry.path)
+                            elif collect_files and not default_ignore_file(entry.name):
+                                files.append(entry.path)
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+        return files
+
+    def read_changes(self, timeout: float) -> Set[str]:
+        """
+        等待最多 timeout 秒并读取一批事件
+
+        Returns:
+            本批次变更的文件路径集合（新建目录中已有的文件也包括在内）
+        """
+        poller = select.poll()
+        poller.register(self.fd, select.POLLIN)
+        if not poller.poll(max(0, int(timeout * 1000))):
+            return set()
+
+        changed: Set[str] = set()
+        while True:
+            try:
+                buf = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            if not buf:
+                break
+            for wd, mask, _cookie, name in parse_events(buf):
+                if mask & IN_Q_OVERFLOW:
+                    self.overflowed = True
+                    continue
+                if mask & IN_IGNORED:
+                    self.wd_to_dir.pop(wd, None)
+                    continue
+                parent = self.wd_to_dir.get(wd)
+                if parent is None or not name:
+                    continue
+                path = os.path.join(parent, name)
+                if mask & IN_ISDIR:
+                    # 新建/移入的目录：补 watch，并补报其中已存在的文件；
+                    # 目录被移入时同一 inode 会复用原 wd，这里同时刷新其路径
+                    if mask & (IN_CREATE | IN_MOVED_TO) and not self._skip_dir(parent, name):
+                        changed.update(self.add_tree(path))
+                    continue
+                if default_ignore_file(name):
+                    continue
+                if mask & (IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE):
+                    changed.add(path)
+        return changed
+
+
+class Debouncer:
+    """
+    合并短时间内的变更：安静 `debounce` 秒后输出一批，持续有变更时
+    最迟 `max_delay` 秒也输出一批
+    """
+
+    def __init__(self, debounce: float = DEFAULT_DEBOUNCE, max_delay: float = DEFAULT_MAX_DELAY,
+                 clock: Callable[[], float] = time.monotonic):
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self._clock = clock
+        self._paths: Set[str] = set()
+        self._first = 0.0
+        self._last = 0.0
+
+    def add(self, paths: Iterable[str]) -> None:
+        paths = set(paths)
+        if not paths:
+            return
+        now = self._clock()
+        if not self._paths:
+            self._first = now
+        self._paths |= paths
+        self._last = now
+
+    def timeout(self) -> Optional[float]:
+        """距离下一次应当 flush 的秒数；没有待输出变更时返回 None"""
+        if not self._paths:
+            return None
+        now = self._clock()
+        return max(0.0, min(self._last + self.debounce, self._first + self.max_delay) - now)
+
+    def flush(self, force: bool = False) -> List[str]:
+        if not self._paths:
+            return []
+        if not force and self.timeout() > 0:
+            return []
+        batch = sorted(self._paths)
+        self._paths = set()
+        return batch
+
+
+def _pidfile(session_id: str, cwd: str) -> Path:
+    digest = hashlib.sha1(os.path.abspath(cwd).encode("utf-8")).hexdigest()[:12]
+    return state_dir() / "watchers" / f"{session_id}-{digest}.pid"
+
+
+def watcher_log(session_id: str, cwd: str) -> Path:
+    """后台 watcher 的 stderr（inotify 不可用、watch 数达到上限等提示）；每次拉起时覆盖"""
+    return _pidfile(session_id, cwd).with_suffix(".log")
+
+
+def _lock_pidfile(pidfile: Path) -> Optional[int]:
+    """
+    对 pidfile 加非阻塞排他锁，返回持有锁的 fd；已有 watcher 持有时返回 None
+
+    锁随打开的文件描述（而不是进程）存在：record hook 加锁后把 fd 传给拉起的
+    watcher，自己关闭后锁仍由 watcher 持有，直到 watcher 退出。
+    """
+    pidfile.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(pidfile, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def _write_pid(fd: int) -> None:
+    os.ftruncate(fd, 0)
+    os.pwrite(fd, str(os.getpid()).encode("ascii"), 0)
+
+
+def watch_session(
+    session_id: str,
+    cwd: str,
+    state_path: str,
+    debounce: float = DEFAULT_DEBOUNCE,
+    max_delay: float = DEFAULT_MAX_DELAY,
+    idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+    ignore_dir: Optional[Callable[[str, str], bool]] = None,
+    lock_fd: Optional[int] = None,
+) -> int:
+    """
+    监听 cwd 并把变更计入 state_path，直到连续 idle_timeout 秒没有变更
+
+    同一 session 的同一 cwd 只允许一个 watcher：lock_fd 为 ensure_watcher 已
+    加锁并传入的 pidfile；未传入时自行加锁，锁已被占用则直接退出。
+
+    Returns:
+        退出码（0 正常退出，1 inotify 不可用）
+    """
+    root = os.path.abspath(cwd)
+    own_state = str(state_dir())
+    # git-ignored 目录（build/、dist/ 等）不加 watch，文件级过滤由 record_external_changes 完成
+    # cwd 不在仓库内时没有 .gitignore 可用，只按用户 glob 过滤
+    repo_root = git_root_for_dir(root) or os.path.realpath(root)
+    config = load_config(repo_root)
+    matcher = get_matcher(repo_root, tuple(config["ignore_globs"]) + ignore_globs_from_env())
+
+    def skip_dir(parent: str, name: str) -> bool:
+        full = os.path.join(parent, name)
+        if full == own_state or full.startswith(own_state + os.sep):
+            return True
+        if matcher.is_ignored(full, is_dir=True):
+            return True
+        return bool(ignore_dir and ignore_dir(parent, name))
+
+    if lock_fd is None:
+        lock_fd = _lock_pidfile(_pidfile(session_id, root))
+        if lock_fd is None:
+            return 0
+    try:
+        _write_pid(lock_fd)
+        try:
+            watcher = InotifyWatcher(ignore_dir=skip_dir)
+        except OSError as e:
+            print(f"codexreview-watch: {e}", file=sys.stderr)
+            return 1
+
+        debouncer = Debouncer(debounce, max_delay)
+        last_activity = time.monotonic()
+        with watcher:
+            watcher.add_tree(root, collect_files=False)
+            if watcher.exhausted:
+                print(
+                    f"codexreview-watch: inotify watch limit reached after {len(watcher.wd_to_dir)} "
+                    "directories (raise fs.inotify.max_user_watches)",
+                    file=sys.stderr,
+                )
+            while watcher.wd_to_dir:
+                wait = debouncer.timeout()
+                if wait is None:
+                    wait = max(0.0, idle_timeout - (time.monotonic() - last_activity))
+                    if wait == 0.0:
+                        break
+                changes = watcher.read_changes(wait)
+                if changes:
+                    debouncer.add(changes)
+                    last_activity = time.monotonic()
+                batch = debouncer.flush()
+                if batch:
+                    record_external_changes(state_path, root, batch)
+            batch = debouncer.flush(force=True)
+            if batch:
+                record_external_changes(state_path, root, batch)
+    finally:
+        # pidfile 不删除：删除后新旧 watcher 可能分别锁住新旧两个 inode
+        try:
+            os.ftruncate(lock_fd, 0)
+        except OSError:
+            pass
+        os.close(lock_fd)
+    return 0
+
+
+def ensure_watcher(session_id: str, cwd: str, project_root: Path, env: Mapping[str, str] | None = None) -> bool:
+    """
+    在开启 `CODEXREVIEW_WATCH` 时确保当前 session 的 cwd 有一个 watcher 在运行
+
+    由 record hook 调用：对 pidfile 尝试一次非阻塞加锁，watcher 已在运行时几乎
+    无开销；加锁成功后把锁连同 fd 交给新拉起的 watcher，并发的 hook 不会重复拉起。
+
+    Returns:
+        是否新拉起了 watcher
+    """
+    if env is None:
+        env = os.environ
+    if not sys.platform.startswith("linux") or not cwd:
+        return False
+    if (env.get(WATCH_ENV) or "").strip().lower() not in ("1", "true", "yes", "y", "on"):
+        return False
+
+    lock_fd = _lock_pidfile(_pidfile(session_id, cwd))
+    if lock_fd is None:
+        return False
+    try:
+        with open(watcher_log(session_id, cwd), "wb") as log:
+            subprocess.Popen(
+                [
+                    sys.executable,
+                    str(project_root / "bin" / "codexreview-watch"),
+                    "--session-id", session_id,
+                    "--cwd", cwd,
+                    "--lock-fd", str(lock_fd),
+                ],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=log,
+                start_new_session=True,
+                close_fds=True,
+                pass_fds=(lock_fd,),
+            )
+    finally:
+        os.close(lock_fd)
+    return True
@@ -0,0 +1,21 @@
+"""测试辅助：把状态目录与用户级配置指向临时目录，避免读写真实的 ~/.claude"""
+
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+
+def isolate_state(case: unittest.TestCase) -> Path:
+    """在 case 结束时自动恢复；返回临时根目录"""
+    td = tempfile.TemporaryDirectory()
+    case.addCleanup(td.cleanup)
+    root = Path(td.name)
+    for target, value in (
+        ("lib.codexreview_state.state_dir", root / "state"),
+        ("lib.codexreview_config.user_config_path", root / "codexreview.json"),
+    ):
+        p = patch(target, return_value=value)
+        p.start()
+        case.addCleanup(p.stop)
+    return root
@@ -1,3 +1,4 @@
+import json
 import os
 import tempfile
 import unittest
@@ -53,5 +54,97 @@ class TestCodeagentResolver(unittest.TestCase):
                 self.assertEqual(cmd, ["codeagent"])
 
 
+class TestAgentPreflight(unittest.TestCase):
+    def setUp(self):
+        self._td = tempfile.TemporaryDirectory()
+        self.root = Path(self._td.name)
+        (self.root / "codeagent").mkdir()
+        self.bin_path = self.root / "codeagent" / "codeagent-wrapper-linux-amd64"
+        self.patches = [
+            patch("lib.codexreview_state.state_dir", return_value=self.root / "state"),
+            patch("lib.codexreview_codeagent._detect_platform", return_value=("linux", "x86_64")),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        self._td.cleanup()
+
+    def _write_agent(self, body, mode=0o644):
+        self.bin_path.write_text("#!/bin/sh\n" + body + "\n")
+        self.bin_path.chmod(mode)
+
+    def test_verifies_once_then_uses_cache(self):
+        from lib.codexreview_codeagent import preflight_agent
+
+        self._write_agent('echo "codeagent 1.2.3"')
+        env = {"PATH": os.environ.get("PATH", ""), "CODEXREVIEW_AGENT_PROBE": "1"}
+        first = preflight_agent(self.root, env)
+        self.assertTrue(first["ok"], first.get("error"))
+        self.assertFalse(first["cached"])
+        self.assertEqual(first["cmd"], [str(self.bin_path)])
+        self.assertEqual(first["version"], "codeagent 1.2.3")
+        self.assertEqual(len(first["sha256"]), 64)
+        # 未命中缓存时补上可执行位
+        self.assertTrue(os.access(self.bin_path, os.X_OK))
+
+        with patch("lib.codexreview_codeagent.subprocess.run") as run:
+            second = preflight_agent(self.root, env)
+            run.assert_not_called()
+        self.assertTrue(second["cached"])
+        self.assertEqual(second["sha256"], first["sha256"])
+
+        # 二进制更新（size/mtime 变化）后重新校验
+        self._write_agent('echo "codeagent 2.0.0-new"', mode=0o755)
+        third = preflight_agent(self.root, env)
+        self.assertFalse(third["cached"])
+        self.assertEqual(third["version"], "codeagent 2.0.0-new")
+
+    def test_probe_is_opt_in_and_never_blocks(self):
+        from lib.codexreview_codeagent import preflight_agent
+
+        self._write_agent('echo "$@" >&2; exit 3', mode=0o755)
+        # 默认不探测
+        with patch("lib.codexreview_codeagent.subprocess.run") as run:
+            result = preflight_agent(self.root, {"PATH": os.environ.get("PATH", "")})
+            run.assert_not_called()
+        self.assertTrue(result["ok"])
+        self.assertNotIn("probe", result)
+
+        # 开启后探测失败只记录，不阻止 review；只探测可执行文件本身
+        override = json.dumps([str(self.bin_path), "--backend", "codex"])
+        result = preflight_agent(
+            self.root, {"PATH": "", "CODEXREVIEW_AGENT_CMD": override, "CODEXREVIEW_AGENT_PROBE": "1"}
+        )
+        self.assertTrue(result["ok"])
+        self.assertEqual(result["cmd"], [str(self.bin_path), "--backend", "codex"])
+        self.assertFalse(result["probe"]["ok"])
+        self.assertEqual(result["probe"]["output"], "exit 3: --version")
+        self.assertIsNone(result["version"])
+
+    def test_not_executable_agent_fails_preflight(self):
+        from lib.codexreview_codeagent import preflight_agent
+
+        script = self.root / "agent.sh"
+        script.write_text("#!/bin/sh\n")
+        script.chmod(0o644)
+        result = preflight_agent(self.root, {"PATH": "", "CODEXREVIEW_AGENT_CMD": str(script)})
+        self.assertFalse(result["ok"])
+
+    def test_missing_agent_fails_preflight(self):
+        from lib.codexreview_codeagent import preflight_agent
+
+        result = preflight_agent(self.root, {"PATH": str(self.root / "empty")})
+        self.assertFalse(result["ok"])
+        self.assertEqual(result["cmd"], ["codeagent"])
+        self.assertIn("not found", result["error"])
+
+        result = preflight_agent(self.root, {"CODEXREVIEW_AGENT_CMD": "no-such-agent-xyz --flag", "PATH": ""})
+        self.assertFalse(result["ok"])
+        self.assertEqual(result["source"], "env")
+
+
 if __name__ == "__main__":
     unittest.main()
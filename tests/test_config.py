@@ -0,0 +1,117 @@
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from lib import codexreview_config
+from lib.codexreview_config import DEFAULT_CONFIG, load_config, validate_layer
+from lib.codexreview_decider import should_run_review
+from lib.codexreview_state import load_state, update_state_from_post_tool_use
+
+
+class TestConfig(unittest.TestCase):
+    def setUp(self):
+        self._td = tempfile.TemporaryDirectory()
+        self.home = Path(self._td.name) / "home"
+        self.repo = Path(self._td.name) / "repo"
+        (self.repo / ".git").mkdir(parents=True)
+        (self.repo / ".claude").mkdir()
+        self.user_cfg = self.home / ".claude" / "codexreview.json"
+        self.user_cfg.parent.mkdir(parents=True)
+        self.patches = [
+            patch("lib.codexreview_config.user_config_path", return_value=self.user_cfg),
+            patch("lib.codexreview_state.state_dir", return_value=self.home / "state"),
+        ]
+        for p in self.patches:
+            p.start()
+        codexreview_config._MEMO.clear()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        codexreview_config._MEMO.clear()
+        self._td.cleanup()
+
+    def _write(self, path: Path, data: dict, bump: int = 0):
+        path.write_text(json.dumps(data))
+        if bump:
+            st = path.stat()
+            os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + bump))
+
+    def test_defaults_without_files(self):
+        cfg = load_config(str(self.repo))
+        self.assertEqual(cfg["score_threshold"], DEFAULT_CONFIG["score_threshold"])
+        self.assertEqual(cfg["bands"], DEFAULT_CONFIG["bands"])
+        self.assertIn("fingerprint", cfg)
+
+    def test_repo_overrides_user(self):
+        self._write(self.user_cfg, {"score_threshold": 6, "write_cap": 50})
+        self._write(self.repo / ".claude" / "codexreview.json", {"score_threshold": 2, "bands": {"lines": [10]}})
+        cfg = load_config(str(self.repo))
+        self.assertEqual(cfg["score_threshold"], 2)
+        self.assertEqual(cfg["write_cap"], 50)
+        self.assertEqual(cfg["bands"]["lines"], [10])
+        self.assertEqual(cfg["bands"]["events"], DEFAULT_CONFIG["bands"]["events"])
+
+    def test_invalid_values_are_dropped(self):
+        with patch("sys.stderr"):
+            layer = validate_layer(
+                {"score_threshold": "high", "bands": {"events": [8, 4]}, "nope": 1, "plan_keywords": ["RFC"]},
+                "test",
+            )
+        self.assertEqual(layer, {"plan_keywords": ["rfc"]})
+
+    def test_cached_until_files_change(self):
+        cfg_path = self.repo / ".claude" / "codexreview.json"
+        self._write(cfg_path, {"score_threshold": 3})
+        self.assertEqual(load_config(str(self.repo))["score_threshold"], 3)
+
+        # 新进程（清空进程内缓存）命中磁盘缓存，不再解析配置文件
+        codexreview_config._MEMO.clear()
+        with patch("lib.codexreview_config._read_layer") as read_layer:
+            self.assertEqual(load_config(str(self.repo))["score_threshold"], 3)
+            read_layer.assert_not_called()
+
+        # 文件变化后自动重载
+        self._write(cfg_path, {"score_threshold": 9}, bump=10**9)
+        self.assertEqual(load_config(str(self.repo))["score_threshold"], 9)
+
+    def test_cache_files_are_evicted(self):
+        cache_dir = self.home / "state" / "cache"
+        with patch("lib.codexreview_config.CACHE_KEEP", 3):
+            for i in range(6):
+                repo = self.home / f"r{i}"
+                repo.mkdir()
+                load_config(str(repo))
+        self.assertEqual(len(list(cache_dir.glob("config-*.json"))), 3)
+
+    def test_decider_and_recorder_use_config(self):
+        self._write(
+            self.repo / ".claude" / "codexreview.json",
+            {"score_threshold": 1, "write_cap": 5, "risk_basenames": ["makefile"]},
+        )
+        state_path = str(self.home / "s.json")
+        update_state_from_post_tool_use(
+            {
+                "session_id": "s",
+                "cwd": str(self.repo),
+                "tool_name": "Write",
+                "tool_input": {"file_path": str(self.repo / "Makefile"), "content": "\n".join("x" * 50)},
+            },
+            state_path,
+        )
+        st = load_state(state_path)
+        self.assertEqual(st["pending"]["lines_touched_est"], 5)
+        self.assertTrue(st["pending"]["flags"]["risk_files"])
+
+        st["pending"]["flags"]["risk_files"] = False
+        st["pending"]["files"] = ["a", "b"]
+        decision = should_run_review(st, load_config(str(self.repo)))
+        self.assertTrue(decision["run"])
+        self.assertEqual(decision["reason"], "score_threshold_met")
+
+
+if __name__ == "__main__":
+    unittest.main()
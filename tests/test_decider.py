@@ -1,8 +1,17 @@
+import os
+import tempfile
 import unittest
 
-from lib.codexreview_decider import should_run_review
+from lib.codexreview_config import default_config, merge_layers
+from lib.codexreview_decider import cached_decision, check_summary, should_run_review
+from lib.codexreview_state import load_state, update_state_from_post_tool_use
+
+from _isolation import isolate_state
 
 class TestDecider(unittest.TestCase):
+    def setUp(self):
+        isolate_state(self)
+
     def test_hard_trigger_plan_docs(self):
         st = {"pending": {"events": 1, "files": ["x"], "modules": ["m"], "lines_touched_est": 1, "flags": {"plan_docs": True, "risk_files": False}}}
         decision = should_run_review(st)
@@ -49,5 +58,72 @@ class TestDecider(unittest.TestCase):
         self.assertIn("score", decision)
         self.assertIn("metrics", decision)
 
+
+def _default(_root):
+    return default_config()
+
+
+class TestDecisionSummary(unittest.TestCase):
+    def setUp(self):
+        isolate_state(self)
+
+    def _record(self, td, state_path, name, content):
+        update_state_from_post_tool_use(
+            {
+                "session_id": "s",
+                "cwd": td,
+                "tool_name": "Write",
+                "tool_input": {"file_path": os.path.join(td, "src", name), "content": content},
+            },
+            state_path,
+            config=default_config(),
+        )
+
+    def _bucket(self, state_path):
+        """摘要按仓库维护：取唯一分桶，包装成 should_run_review 接受的形状"""
+        (bucket,) = load_state(state_path)["pending"]["repos"].values()
+        return {"pending": bucket}
+
+    def test_recorder_keeps_summary_consistent(self):
+        with tempfile.TemporaryDirectory() as td:
+            state_path = os.path.join(td, "s.json")
+            for i in range(5):
+                self._record(td, state_path, f"m{i}/f.py", "x\n" * 40)
+                self.assertEqual(check_summary(load_state(state_path), td, _default), {})
+            self._record(td, state_path, "conf.py", 'password = "hunter2hunter2"\n')
+            self.assertEqual(check_summary(load_state(state_path), td, _default), {})
+            st = self._bucket(state_path)
+
+            decision = cached_decision(st, default_config())
+            self.assertEqual(decision, should_run_review(st, default_config()))
+            self.assertEqual(decision["reason"], "content_risk")
+            self.assertIn("- 新增内容命中风险规则: secret", decision["prompt_header"])
+
+    def test_cached_decision_uses_summary_until_config_changes(self):
+        with tempfile.TemporaryDirectory() as td:
+            state_path = os.path.join(td, "s.json")
+            self._record(td, state_path, "a.py", "x")
+            full = load_state(state_path)
+            (root,) = full["pending"]["repos"]
+            st = {"pending": full["pending"]["repos"][root]}
+            # 篡改摘要：同一配置下直接采用摘要，检查器能按仓库发现不一致
+            st["pending"]["summary"]["score"] = 99
+            self.assertEqual(cached_decision(st, default_config())["score"], 99)
+            self.assertEqual(check_summary(full, td, _default), {root: ["score"]})
+
+            # 配置指纹变化时退回全量计算
+            other = merge_layers({"score_threshold": 0})
+            decision = cached_decision(st, other)
+            self.assertEqual(decision["score"], 0)
+            self.assertEqual(decision["reason"], "score_threshold_met")
+
+    def test_missing_summary(self):
+        with tempfile.TemporaryDirectory() as td:
+            # 旧版本状态没有分桶：整个 pending 按 cwd 所在仓库检查
+            st = {"pending": {"events": 1, "files": ["x"], "modules": ["m"], "lines_touched_est": 1, "flags": {}}}
+            self.assertEqual(list(check_summary(st, td, _default).values()), [["missing"]])
+        self.assertEqual(cached_decision(st), should_run_review(st))
+
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
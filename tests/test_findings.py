@@ -0,0 +1,117 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from lib.codexreview_findings import (
+    format_open_findings,
+    load_findings_index,
+    open_findings_for,
+    parse_findings,
+    select_files_for_review,
+    update_findings_index,
+)
+from lib.codexreview_stop_runner import run_review_if_needed
+
+
+class TestFindings(unittest.TestCase):
+    def test_parse_text_and_json_findings(self):
+        with tempfile.TemporaryDirectory() as td:
+            output = "\n".join(
+                [
+                    "## Review",
+                    "- [P1] src/a.py:12-15 SQL 拼接未转义",
+                    "- low: src/b.py:3 变量命名不清晰",
+                    '{"file": "src/c.py", "line": 7, "severity": "critical", "message": "密钥硬编码"}',
+                    "总结：无其它问题",
+                ]
+            )
+            findings = parse_findings(output, td)
+            self.assertEqual([f["file"] for f in findings], ["src/a.py", "src/b.py", "src/c.py"])
+            self.assertEqual(findings[0]["severity"], "high")
+            self.assertEqual((findings[0]["line_start"], findings[0]["line_end"]), (12, 15))
+            self.assertEqual(findings[1]["severity"], "low")
+            self.assertEqual(findings[2]["severity"], "critical")
+
+    def test_ignores_lines_without_severity_and_urls(self):
+        with tempfile.TemporaryDirectory() as td:
+            output = "\n".join(
+                [
+                    "Overall the change to src/a.py:12 looks fine.",
+                    "src/geom.py:30 now computes distance between p1 and p2 correctly.",
+                    "- [high] see https://docs.python.org:443/3/library/re.html",
+                    "- [P2] https://example.com:8080/x.py:3 vs src/b.py:7 重复逻辑",
+                ]
+            )
+            findings = parse_findings(output, td)
+            self.assertEqual([(f["file"], f["line_start"]) for f in findings], [("src/b.py", 7)])
+
+    def test_message_drops_severity_marker(self):
+        with tempfile.TemporaryDirectory() as td:
+            [a, b] = parse_findings("- [P2] src/a.py:10 missing None check\n**High**: src/b.py:3 越界访问", td)
+            self.assertEqual((a["severity"], a["message"]), ("medium", "missing None check"))
+            self.assertEqual((b["severity"], b["message"]), ("high", "越界访问"))
+            self.assertEqual(format_open_findings([a]), ["  - [medium] src/a.py:10 missing None check"])
+
+    def test_fingerprint_stable_across_line_shift(self):
+        with tempfile.TemporaryDirectory() as td:
+            a = parse_findings("- [P2] src/a.py:10 问题 A", td)
+            b = parse_findings("- [P2] src/a.py:42 问题 A", td)
+            self.assertEqual(a[0]["fingerprint"], b[0]["fingerprint"])
+
+    def test_unreported_findings_are_resolved(self):
+        with tempfile.TemporaryDirectory() as td:
+            src = os.path.join(td, "a.py")
+            with open(src, "w") as f:
+                f.write("x = 1\n")
+            index = load_findings_index(os.path.join(td, "idx.json"), td)
+            update_findings_index(index, td, [src], parse_findings("[high] a.py:1 问题 A", td))
+            self.assertEqual(len(open_findings_for(index, td, [src])), 1)
+
+            update_findings_index(index, td, [src], [])
+            self.assertEqual(open_findings_for(index, td, [src]), [])
+
+    def test_select_skips_unchanged_clean_files(self):
+        with tempfile.TemporaryDirectory() as td:
+            clean = os.path.join(td, "clean.py")
+            dirty = os.path.join(td, "dirty.py")
+            changed = os.path.join(td, "changed.py")
+            for p in (clean, dirty, changed):
+                with open(p, "w") as f:
+                    f.write("x = 1\n")
+            index = load_findings_index(os.path.join(td, "idx.json"), td)
+            update_findings_index(index, td, [clean, dirty, changed], parse_findings("[high] dirty.py:1 问题", td))
+            with open(changed, "w") as f:
+                f.write("x = 2\n")
+
+            to_review, skipped = select_files_for_review(index, td, [clean, dirty, changed])
+            self.assertEqual(to_review, [dirty, changed])
+            self.assertEqual(skipped, [clean])
+
+    def test_runner_writes_index_on_success(self):
+        with tempfile.TemporaryDirectory() as td:
+            state_path = os.path.join(td, "state.json")
+            index_path = os.path.join(td, "findings.json")
+            src = os.path.join(td, "a.py")
+            with open(src, "w") as f:
+                f.write("x = 1\n")
+
+            with patch("lib.codexreview_stop_runner.subprocess.run") as mock_run:
+                mock_run.return_value = MagicMock(returncode=0, stdout="[P0] a.py:1 越权访问\n")
+                result = run_review_if_needed(
+                    state_path, td, ["mock-agent"], "p",
+                    findings_path=index_path, repo_root=td, reviewed_files=[src],
+                )
+
+            self.assertEqual(result["findings"], 1)
+            with open(index_path) as f:
+                index = json.load(f)
+            self.assertIn("a.py", index["files"])
+            [item] = index["findings"].values()
+            self.assertEqual(item["status"], "open")
+            self.assertEqual(item["severity"], "critical")
+
+
+if __name__ == "__main__":
+    unittest.main()
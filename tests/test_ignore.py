@@ -0,0 +1,172 @@
+import os
+import subprocess
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from lib.codexreview_ignore import IgnoreMatcher, compile_rules, get_matcher
+from lib.codexreview_state import load_state, update_state_from_post_tool_use
+
+from _isolation import isolate_state
+
+
+def _git_check_ignore(root: str, rel: str, env=None) -> bool:
+    return subprocess.run(["git", "check-ignore", "-q", "--no-index", rel], cwd=root, env=env).returncode == 0
+
+
+class TestIgnore(unittest.TestCase):
+    def setUp(self):
+        isolate_state(self)
+
+    def _repo(self, td: str) -> Path:
+        root = Path(td) / "repo"
+        root.mkdir()
+        subprocess.run(["git", "init", "-q"], cwd=root, check=True)
+        (root / ".gitignore").write_text(
+            "\n".join(
+                [
+                    "# build outputs",
+                    "dist/",
+                    "*.log",
+                    "!keep.log",
+                    "/local.cfg",
+                    "docs/**/gen_*.md",
+                    "cache[0-9]",
+                    "node_modules",
+                ]
+            )
+            + "\n"
+        )
+        (root / "pkg").mkdir()
+        (root / "pkg" / ".gitignore").write_text("generated/\n!important.log\n")
+        return root
+
+    def test_compile_rules_line_syntax(self):
+        # 注释与空行不产生规则
+        self.assertIsNone(compile_rules(["# comment", "   "]).match("# comment", False))
+        # ! 取反，结尾 / 只匹配目录
+        rules = compile_rules(["foo", "!foo/"])
+        self.assertIs(rules.match("foo", True), False)
+        self.assertIs(rules.match("a/foo", False), True)
+        # 转义的 # 是字面量
+        self.assertIs(compile_rules(["\\#file"]).match("sub/#file", False), True)
+
+    def test_matches_git_check_ignore(self):
+        with tempfile.TemporaryDirectory() as td:
+            root = self._repo(td)
+            matcher = IgnoreMatcher(str(root))
+            cases = [
+                "dist/app.js",
+                "src/dist/app.js",
+                "src/a.py",
+                "server.log",
+                "keep.log",
+                "sub/keep.log",
+                "local.cfg",
+                "sub/local.cfg",
+                "docs/a/b/gen_x.md",
+                "docs/gen_y.md",
+                "docs/a/x.md",
+                "cache1/x",
+                "cacheA/x",
+                "node_modules/lib/index.js",
+                "pkg/generated/out.py",
+                "pkg/important.log",
+                "pkg/other.log",
+            ]
+            for rel in cases:
+                with self.subTest(rel=rel):
+                    self.assertEqual(
+                        matcher.is_ignored(str(root / rel)),
+                        _git_check_ignore(str(root), rel),
+                    )
+
+    def test_fast_path_rules_match_git(self):
+        with tempfile.TemporaryDirectory() as td:
+            root = self._repo(td)
+            (root / ".gitignore").write_text(
+                "\n".join(["build", "*.pyc", "tmp*", "/top.txt", "!tmp_keep", "a/b.txt", "x?.py", "build"]) + "\n"
+            )
+            matcher = IgnoreMatcher(str(root))
+            for rel in (
+                "build/x", "src/build", "m.pyc", "src/m.pyc", "m.pyc.bak", "tmp1/a", "src/tmpfile",
+                "tmp_keep", "src/tmp_keep", "top.txt", "src/top.txt", "a/b.txt", "c/a/b.txt", "x1.py", "xy/z",
+            ):
+                with self.subTest(rel=rel):
+                    self.assertEqual(
+                        matcher.is_ignored(str(root / rel)),
+                        _git_check_ignore(str(root), rel),
+                    )
+
+    def test_core_excludes_file(self):
+        with tempfile.TemporaryDirectory() as td:
+            root = self._repo(td)
+            home = Path(td) / "home"
+            home.mkdir()
+            (home / "my-ignore").write_text("*.swp\n")
+            (home / ".gitconfig").write_text('[user]\n\tname = x\n[core]\n\texcludesFile = "~/my-ignore"\n')
+            env = {"HOME": str(home), "PATH": os.environ.get("PATH", "")}
+            matcher = IgnoreMatcher(str(root), env=env)
+            self.assertTrue(matcher.is_ignored(str(root / "src" / "a.py.swp")))
+            self.assertTrue(_git_check_ignore(str(root), "src/a.py.swp", env))
+
+            # 未配置时退回 $XDG_CONFIG_HOME/git/ignore
+            (home / ".gitconfig").write_text("[user]\n\tname = x\n")
+            xdg = home / ".config" / "git"
+            xdg.mkdir(parents=True)
+            (xdg / "ignore").write_text("*.bak\n")
+            matcher = IgnoreMatcher(str(root), env=env)
+            self.assertFalse(matcher.is_ignored(str(root / "a.swp")))
+            self.assertTrue(matcher.is_ignored(str(root / "a.bak")))
+
+    def test_cache_invalidated_by_mtime(self):
+        with tempfile.TemporaryDirectory() as td:
+            root = self._repo(td)
+            matcher = get_matcher(str(root))
+            target = str(root / "src" / "a.py")
+            self.assertFalse(matcher.is_ignored(target))
+
+            gi = root / ".gitignore"
+            gi.write_text(gi.read_text() + "src/\n")
+            future = time.time() + 5
+            os.utime(gi, (future, future))
+            self.assertTrue(matcher.is_ignored(target))
+
+    def test_user_globs_and_non_git_dir(self):
+        with tempfile.TemporaryDirectory() as td:
+            matcher = IgnoreMatcher(td, extra_globs=["*.min.js", "vendor/"])
+            self.assertTrue(matcher.is_ignored(os.path.join(td, "static", "app.min.js")))
+            self.assertTrue(matcher.is_ignored(os.path.join(td, "vendor", "x.py")))
+            self.assertFalse(matcher.is_ignored(os.path.join(td, "src", "x.py")))
+            self.assertFalse(matcher.is_ignored("/somewhere/else.py"))
+
+    def test_recorder_skips_ignored_files(self):
+        with tempfile.TemporaryDirectory() as td:
+            root = self._repo(td)
+            state_path = os.path.join(td, "s.json")
+
+            def write(path):
+                update_state_from_post_tool_use(
+                    {
+                        "session_id": "s",
+                        "cwd": str(root),
+                        "tool_name": "Write",
+                        "tool_input": {"file_path": str(path), "content": "x\n"},
+                    },
+                    state_path,
+                )
+
+            write(root / "dist" / "bundle.js")
+            write(root / "src" / "a.py")
+            with patch.dict(os.environ, {"CODEXREVIEW_IGNORE_GLOBS": "src/b.py"}):
+                write(root / "src" / "b.py")
+
+            st = load_state(state_path)
+            self.assertEqual(st["pending"]["events"], 1)
+            self.assertEqual(st["pending"]["files"], [str(root / "src" / "a.py")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import os
+import tempfile
+import unittest
+
+from lib.codexreview_linediff import added_lines, count_changed_lines, count_multiedit_lines
+from lib.codexreview_state import update_state_from_post_tool_use, load_state
+
+from _isolation import isolate_state
+
+
+class TestLineDiff(unittest.TestCase):
+    def setUp(self):
+        isolate_state(self)
+
+    def test_identical_is_zero(self):
+        self.assertEqual(count_changed_lines("a\nb\n", "a\nb\n"), 0)
+
+    def test_single_char_change_in_large_block(self):
+        old = "\n".join(f"line {i}" for i in range(300))
+        new = old.replace("line 150", "line 150!")
+        self.assertEqual(count_changed_lines(old, new), 1)
+
+    def test_pure_insert_and_delete(self):
+        self.assertEqual(count_changed_lines("a\nb\n", "a\nx\ny\nb\n"), 2)
+        self.assertEqual(count_changed_lines("a\nx\ny\nb\n", "a\nb\n"), 2)
+
+    def test_replacement_counts_max_side(self):
+        # 删除 1 行、新增 3 行 -> 3
+        self.assertEqual(count_changed_lines("a\n", "b\n\nc\n"), 3)
+
+    def test_reordering_counts_moved_lines(self):
+        # 交换相邻两行：一行移动
+        self.assertEqual(count_changed_lines("a\nb\nc\nd\n", "a\nc\nb\nd\n"), 1)
+        # 整段倒序：只有一行能保持相对顺序
+        old = "\n".join(f"line {i}" for i in range(100))
+        new = "\n".join(f"line {i}" for i in reversed(range(100)))
+        self.assertEqual(count_changed_lines(old, new), 99)
+        # 重复行整体对调（与 difflib 结果一致）
+        repeated = ["}"] * 200 + ["x"] * 200
+        self.assertEqual(count_changed_lines("\n".join(repeated), "\n".join(reversed(repeated))), 200)
+
+    def test_added_lines_skip_context_and_moves(self):
+        self.assertEqual(added_lines("a\nb\nc\n", "a\nB\nc\nd\n"), ["B", "d"])
+        self.assertEqual(added_lines("a\nb\n", "b\na\n"), [])
+        self.assertEqual(added_lines("x\n", "x\nx\n"), ["x"])
+
+    def test_cap_falls_back_to_upper_bound(self):
+        old = "\n".join(f"o{i}" for i in range(50))
+        new = "\n".join(f"n{i}" for i in range(40))
+        self.assertEqual(count_changed_lines(old, new, max_lines=10), 50)
+
+    def test_multiedit_sums_edits(self):
+        edits = [
+            {"old_string": "a\nb\nc", "new_string": "a\nB\nc"},
+            {"old_string": "x", "new_string": "y\nz"},
+            "not-a-dict",
+        ]
+        self.assertEqual(count_multiedit_lines(edits), 3)
+
+    def test_record_multiedit_event(self):
+        with tempfile.TemporaryDirectory() as td:
+            state_path = os.path.join(td, "s.json")
+            event = {
+                "session_id": "s",
+                "cwd": td,
+                "hook_event_name": "PostToolUse",
+                "tool_name": "MultiEdit",
+                "tool_input": {
+                    "file_path": os.path.join(td, "src", "a.py"),
+                    "edits": [{"old_string": "a\nb\n", "new_string": "a\nc\n"}],
+                },
+                "tool_use_id": "toolu_1",
+            }
+            update_state_from_post_tool_use(event, state_path)
+            st = load_state(state_path)
+            self.assertEqual(st["pending"]["events"], 1)
+            self.assertEqual(st["pending"]["lines_touched_est"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+from unittest.mock import patch
+
+from bench.loadtest import parse_stop_output, percentiles, run_load
+
+
+class TestLoadHarness(unittest.TestCase):
+    def test_percentiles(self):
+        p = percentiles([0.001 * i for i in range(101)])
+        self.assertEqual(p["count"], 101)
+        self.assertAlmostEqual(p["p50"], 50.0, delta=1.0)
+        self.assertAlmostEqual(p["max"], 100.0, places=6)
+
+    def test_parse_stop_output_per_repo(self):
+        out = "\n".join(
+            [
+                "[run=Y] reason=score_threshold_met score=3 events=4 files=2 modules=2 lines=40 repo=/w/a",
+                "[run=Y] reason=plan_docs score=1 events=2 files=1 modules=1 lines=3 repo=/w/b c",
+                "[run=Y] reason=risk_files score=0 events=5 files=1 modules=1 lines=1 repo=/w/d",
+                "[run=N] reason=score_too_low score=0 events=1 files=1 modules=1 lines=1 repo=/w/e",
+                "[review_completed] files=2 skipped=0 findings=0 score=3 repo=/w/a",
+                "[review_skipped] reason=unchanged_since_last_review files=1 repo=/w/b c",
+                "[review_failed] returncode=1 repo=/w/d",
+            ]
+        )
+        self.assertEqual(parse_stop_output(out), (3, 2, 6))
+        # agent 不可用时 pending 保留，不算被 review
+        out = (
+            "[run=Y] reason=plan_docs score=1 events=2 files=1 modules=1 lines=3 repo=/w/a\n"
+            "[review_skipped] reason=agent_unavailable error=missing"
+        )
+        self.assertEqual(parse_stop_output(out), (1, 0, 0))
+
+    def test_sequential_sessions_lose_no_events(self):
+        report = run_load(sessions=2, events=4, stop_every=2, agent_latency=0.0, agent_output_lines=1)
+        self.assertEqual(report["events"]["sent"], 8)
+        self.assertEqual(report["events"]["lost"], 0)
+        self.assertEqual(report["errors"], {"record": 0, "stop": 0})
+        self.assertEqual(report["latency_ms"]["record"]["count"], 8)
+        self.assertEqual(report["latency_ms"]["stop"]["count"], 4)
+
+    def test_runs_without_resource_module(self):
+        with patch("bench.loadtest.resource", None):
+            report = run_load(sessions=1, events=2, stop_every=2, agent_latency=0.0, agent_output_lines=1)
+        self.assertEqual(report["events"]["lost"], 0)
+        self.assertIsNone(report["state_io"]["block_reads"])
+        self.assertIsNone(report["state_io"]["block_writes"])
+
+
+if __name__ == "__main__":
+    unittest.main()
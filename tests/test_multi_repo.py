@@ -0,0 +1,173 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from lib.codexreview_state import bucket_root, load_state, pending_buckets, update_state_from_post_tool_use
+from lib.codexreview_stop_runner import clear_pending
+
+from _isolation import isolate_state
+
+project_root = Path(__file__).resolve().parents[1]
+
+# 记录 agent 的工作目录与收到的变更文件
+AGENT = """
+import os, sys, time
+prompt = sys.stdin.read() if "--version" not in sys.argv else ""
+if "--version" in sys.argv:
+    print("agent 1.0"); sys.exit(0)
+time.sleep(0.3)
+files = [l for l in prompt.splitlines() if l.startswith("- 变更文件:")]
+with open(os.path.join(sys.argv[1], os.path.basename(os.getcwd()) + ".log"), "w") as f:
+    f.write(os.getcwd() + "\\n" + "\\n".join(files))
+"""
+
+
+class TestMultiRepo(unittest.TestCase):
+    def setUp(self):
+        self._td = tempfile.TemporaryDirectory()
+        self.td = Path(self._td.name).resolve()
+        self.repos = []
+        for name in ("alpha", "beta"):
+            repo = self.td / name
+            (repo / ".git").mkdir(parents=True)
+            self.repos.append(repo)
+        self.state_path = str(self.td / "state" / "s.json")
+        isolate_state(self)
+
+    def tearDown(self):
+        self._td.cleanup()
+
+    def _write(self, state_path, cwd, file_path, lines):
+        update_state_from_post_tool_use(
+            {
+                "session_id": "s",
+                "cwd": str(cwd),
+                "tool_name": "Write",
+                "tool_input": {"file_path": str(file_path), "content": "x\n" * lines},
+            },
+            state_path,
+        )
+
+    def test_pending_is_bucketed_by_repo(self):
+        alpha, beta = self.repos
+        # cwd 一直在 alpha，但 beta 的文件计入 beta 的分桶
+        self._write(self.state_path, alpha, alpha / "src" / "a.py", 10)
+        self._write(self.state_path, alpha, beta / "pkg" / "b.py", 10)
+        self._write(self.state_path, alpha, beta / "pkg" / "c.py", 10)
+
+        pending = load_state(self.state_path)["pending"]
+        self.assertEqual(pending["events"], 3)
+        self.assertEqual(sorted(pending["repos"]), [str(alpha), str(beta)])
+        self.assertEqual(pending["repos"][str(alpha)]["files"], [str(alpha / "src" / "a.py")])
+        self.assertEqual(pending["repos"][str(beta)]["modules"], ["pkg/b.py", "pkg/c.py"])
+        self.assertEqual(pending["repos"][str(beta)]["summary"]["metrics"]["files"], 2)
+
+        # 只清空一个仓库时，会话汇总由剩余分桶重建
+        clear_pending(self.state_path, repo_root=str(beta))
+        pending = load_state(self.state_path)["pending"]
+        self.assertEqual(list(pending["repos"]), [str(alpha)])
+        self.assertEqual(pending["events"], 1)
+        self.assertEqual(pending["files"], [str(alpha / "src" / "a.py")])
+        self.assertEqual(pending["lines_touched_est"], 11)
+
+    def test_legacy_pending_is_kept_as_cwd_bucket(self):
+        alpha, beta = self.repos
+        legacy_files = [str(alpha / "a.py"), str(alpha / "b.py")]
+        os.makedirs(os.path.dirname(self.state_path))
+        with open(self.state_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "pending": {
+                        "events": 5,
+                        "files": legacy_files,
+                        "modules": ["a.py", "b.py"],
+                        "lines_touched_est": 40,
+                        "lines_touched_git": None,
+                        "flags": {"plan_docs": False, "risk_files": False},
+                    },
+                    "meta": {"last_review_at": None},
+                },
+                f,
+            )
+
+        self._write(self.state_path, alpha, alpha / "new.py", 1)
+        self._write(self.state_path, alpha, beta / "other.py", 1)
+
+        pending = load_state(self.state_path)["pending"]
+        bucket = pending["repos"][str(alpha)]
+        self.assertEqual(bucket["events"], 6)
+        self.assertEqual(bucket["files"], legacy_files + [str(alpha / "new.py")])
+        self.assertEqual(bucket["lines_touched_est"], 42)
+        self.assertEqual(pending["repos"][str(beta)]["events"], 1)
+        self.assertEqual(pending["events"], 7)
+
+        # 清空另一个仓库后，旧改动仍在汇总中
+        clear_pending(self.state_path, repo_root=str(beta))
+        pending = load_state(self.state_path)["pending"]
+        self.assertEqual(pending["events"], 6)
+        self.assertEqual(pending["files"], legacy_files + [str(alpha / "new.py")])
+
+    def test_outside_any_repo_falls_back_to_cwd(self):
+        alpha, _ = self.repos
+        outside = self.td / "scratch"
+        outside.mkdir()
+        # 仓库外的文件归入 cwd 所在仓库；cwd 也在仓库外时归入 cwd 本身
+        self.assertEqual(bucket_root(str(outside / "x.py"), str(alpha / "src")), str(alpha))
+        self.assertEqual(bucket_root(str(outside / "x.py"), str(outside)), str(outside))
+        legacy = {"pending": {"events": 1, "files": ["x"], "modules": [], "lines_touched_est": 0, "flags": {}}}
+        self.assertEqual(list(pending_buckets(legacy, str(outside))), [str(outside)])
+
+    def test_stop_reviews_each_repo_in_its_own_directory(self):
+        home = self.td / "home"
+        state_path = home / ".claude" / "state" / "codexreview" / "s.json"
+        alpha, beta = self.repos
+        with patch("lib.codexreview_state.state_dir", return_value=state_path.parent):
+            for repo in (alpha, beta):
+                for i in range(4):
+                    self._write(str(state_path), alpha, repo / f"m{i}" / "f.py", 40)
+            # 第三个仓库只有一次小改动，达不到阈值
+            gamma = self.td / "gamma"
+            (gamma / ".git").mkdir(parents=True)
+            self._write(str(state_path), alpha, gamma / "x.py", 1)
+
+        agent = self.td / "agent.py"
+        agent.write_text(AGENT, encoding="utf-8")
+        logs = self.td / "logs"
+        logs.mkdir()
+        env = dict(os.environ)
+        env["HOME"] = str(home)
+        env["CODEXREVIEW_AGENT_CMD"] = json.dumps([sys.executable, str(agent), str(logs)])
+        env["CODEXREVIEW_CHECK_SUMMARY"] = "1"
+        proc = subprocess.run(
+            [sys.executable, str(project_root / "bin" / "codexreview-stop")],
+            input=json.dumps({"session_id": "s", "cwd": str(alpha), "stop_hook_active": False}),
+            text=True,
+            capture_output=True,
+            env=env,
+            timeout=60,
+        )
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+        self.assertNotIn("summary mismatch", proc.stderr)
+        self.assertEqual(proc.stdout.count("[run=Y]"), 2, proc.stdout)
+        self.assertIn(f"[run=N] reason=score_too_low score=0 events=1 files=1 modules=1 lines=2 repo={gamma}", proc.stdout)
+        self.assertEqual(proc.stdout.count("[review_completed]"), 2, proc.stdout)
+
+        for repo in (alpha, beta):
+            cwd, files = (logs / f"{repo.name}.log").read_text(encoding="utf-8").split("\n", 1)
+            self.assertEqual(cwd, str(repo))
+            self.assertIn(str(repo / "m0" / "f.py"), files)
+            other = beta if repo == alpha else alpha
+            self.assertNotIn(str(other), files)
+
+        pending = load_state(str(state_path))["pending"]
+        self.assertEqual(list(pending["repos"]), [str(gamma)])
+        self.assertEqual(pending["events"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
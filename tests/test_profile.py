@@ -0,0 +1,45 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from lib.codexreview_profile import aggregate_profiles, run_profiled
+
+
+def _work() -> int:
+    sum(i * i for i in range(1000))
+    return 7
+
+
+class TestProfile(unittest.TestCase):
+    def test_disabled_by_default(self):
+        with tempfile.TemporaryDirectory() as td, patch(
+            "lib.codexreview_profile.state_dir", return_value=Path(td)
+        ):
+            self.assertEqual(run_profiled("record", _work, env={}), 7)
+            self.assertFalse((Path(td) / "profiles").exists())
+
+    def test_capture_rotate_and_aggregate(self):
+        with tempfile.TemporaryDirectory() as td, patch(
+            "lib.codexreview_profile.state_dir", return_value=Path(td)
+        ):
+            env = {"CODEXREVIEW_PROFILE": "mem", "CODEXREVIEW_PROFILE_KEEP": "3"}
+            for hook in ("record", "record", "stop", "stop"):
+                self.assertEqual(run_profiled(hook, _work, env=env), 7)
+
+            directory = Path(td) / "profiles"
+            self.assertEqual(len(list(directory.glob("*.prof"))), 3)
+            self.assertEqual(len(list(directory.glob("*.json"))), 3)
+
+            report = aggregate_profiles(directory, top=5)
+            self.assertEqual(report["runs"], 3)
+            self.assertEqual(report["hooks"]["stop"]["runs"], 2)
+            self.assertIsNotNone(report["hooks"]["stop"]["peak_kb_max"])
+            self.assertTrue(any("_work" in f["function"] for f in report["functions"]))
+
+            only_stop = aggregate_profiles(directory, hook="stop")
+            self.assertEqual(only_stop["runs"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
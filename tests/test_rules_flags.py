@@ -4,7 +4,12 @@ import unittest
 
 from lib.codexreview_state import update_state_from_post_tool_use, load_state
 
+from _isolation import isolate_state
+
 class TestRuleFlags(unittest.TestCase):
+    def setUp(self):
+        isolate_state(self)
+
     def test_plan_docs_sets_flag(self):
         with tempfile.TemporaryDirectory() as td:
             state_path = os.path.join(td, "s.json")
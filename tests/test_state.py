@@ -2,11 +2,17 @@ import io
 import json
 import os
 import tempfile
+import threading
 import unittest
 
 from lib.codexreview_state import update_state_from_post_tool_use, load_state
 
+from _isolation import isolate_state
+
 class TestState(unittest.TestCase):
+    def setUp(self):
+        isolate_state(self)
+
     def test_record_edit_updates_pending(self):
         with tempfile.TemporaryDirectory() as td:
             state_path = os.path.join(td, "s.json")
@@ -28,5 +34,31 @@ class TestState(unittest.TestCase):
             self.assertIn(os.path.join(td, "src", "a.py"), st["pending"]["files"])
             self.assertGreaterEqual(st["pending"]["lines_touched_est"], 3)
 
+    def test_concurrent_writers_do_not_lose_updates(self):
+        with tempfile.TemporaryDirectory() as td:
+            state_path = os.path.join(td, "s.json")
+
+            def write(i):
+                update_state_from_post_tool_use(
+                    {
+                        "session_id": "s",
+                        "cwd": td,
+                        "tool_name": "Write",
+                        "tool_input": {"file_path": os.path.join(td, f"f{i}.py"), "content": "x\n"},
+                        "tool_use_id": f"toolu_{i}",
+                    },
+                    state_path,
+                )
+
+            threads = [threading.Thread(target=write, args=(i,)) for i in range(16)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            st = load_state(state_path)
+            self.assertEqual(st["pending"]["events"], 16)
+            self.assertEqual(len(st["pending"]["files"]), 16)
+
+
 if __name__ == "__main__":
-    unittest.main()
\ No newline at end of file
+    unittest.main()
@@ -0,0 +1,150 @@
+import json
+import os
+import tempfile
+import unittest
+
+from lib.codexreview_state import load_state, update_state_from_post_tool_use
+from lib.codexreview_transcript import reconcile_transcript, scan_transcript
+
+from _isolation import isolate_state
+
+
+def _tool_use(tool_id, name, file_path, cwd, **extra):
+    tool_input = {"file_path": file_path, **extra}
+    return {
+        "type": "assistant",
+        "cwd": cwd,
+        "message": {"content": [{"type": "tool_use", "id": tool_id, "name": name, "input": tool_input}]},
+    }
+
+
+def _tool_result(tool_id, is_error=False):
+    return {
+        "type": "user",
+        "message": {"content": [{"type": "tool_result", "tool_use_id": tool_id, "is_error": is_error}]},
+    }
+
+
+class TestTranscript(unittest.TestCase):
+    def setUp(self):
+        self._td = tempfile.TemporaryDirectory()
+        self.td = self._td.name
+        os.mkdir(os.path.join(self.td, ".git"))
+        self.transcript = os.path.join(self.td, "t.jsonl")
+        self.state_path = os.path.join(self.td, "state", "s.json")
+        open(self.transcript, "w").close()
+        isolate_state(self)
+
+    def tearDown(self):
+        self._td.cleanup()
+
+    def _append(self, *records, partial=False):
+        with open(self.transcript, "a", encoding="utf-8") as f:
+            for r in records:
+                f.write(json.dumps(r) + "\n")
+            if partial:
+                f.write('{"type": "assistant", "message": {"content": [{"type": "tool_use"')
+
+    def _path(self, name):
+        return os.path.join(self.td, "src", name)
+
+    def test_recovers_missed_tool_uses_once(self):
+        self._append(
+            {"type": "user", "message": {"content": "hi"}},
+            _tool_use("t1", "Write", self._path("a.py"), self.td, content="x\ny\n"),
+            _tool_result("t1"),
+            _tool_use("t2", "Edit", self._path("b.py"), self.td, old_string="a", new_string="b"),
+            _tool_result("t2", is_error=True),
+            _tool_use("t3", "Read", self._path("c.py"), self.td),
+            _tool_result("t3"),
+        )
+        self.assertEqual(reconcile_transcript(self.state_path, self.transcript, self.td), 1)
+        st = load_state(self.state_path)
+        self.assertEqual(st["pending"]["events"], 1)
+        self.assertEqual(st["pending"]["files"], [self._path("a.py")])
+        self.assertEqual(st["meta"]["transcript_offset"], os.path.getsize(self.transcript))
+
+        # 重复调用不会重复计入
+        self.assertEqual(reconcile_transcript(self.state_path, self.transcript, self.td), 0)
+        self.assertEqual(load_state(self.state_path)["pending"]["events"], 1)
+
+    def test_skips_tool_uses_recorded_by_hook(self):
+        update_state_from_post_tool_use(
+            {
+                "session_id": "s",
+                "cwd": self.td,
+                "tool_name": "Edit",
+                "tool_use_id": "t1",
+                "transcript_path": self.transcript,
+                "tool_input": {"file_path": self._path("a.py"), "old_string": "a", "new_string": "b"},
+            },
+            self.state_path,
+        )
+        self.assertEqual(load_state(self.state_path)["meta"]["transcript_offset"], 0)
+        self._append(
+            _tool_use("t1", "Edit", self._path("a.py"), self.td, old_string="a", new_string="b"),
+            _tool_result("t1"),
+            _tool_use("t2", "Edit", self._path("b.py"), self.td, old_string="a", new_string="b"),
+            _tool_result("t2"),
+        )
+        self.assertEqual(reconcile_transcript(self.state_path, self.transcript, self.td), 1)
+        st = load_state(self.state_path)
+        self.assertEqual(st["pending"]["events"], 2)
+        self.assertEqual(sorted(st["meta"]["seen_tool_use_ids"]), ["t1", "t2"])
+
+    def test_recovers_tool_uses_missed_before_first_record(self):
+        for i in range(3):
+            self._append(
+                _tool_use(f"t{i}", "Write", self._path(f"f{i}.py"), self.td, content="x\n"), _tool_result(f"t{i}")
+            )
+        # record hook 只对 t2 成功执行
+        update_state_from_post_tool_use(
+            {
+                "session_id": "s",
+                "cwd": self.td,
+                "tool_name": "Write",
+                "tool_use_id": "t2",
+                "transcript_path": self.transcript,
+                "tool_input": {"file_path": self._path("f2.py"), "content": "x\n"},
+            },
+            self.state_path,
+        )
+        self.assertEqual(reconcile_transcript(self.state_path, self.transcript, self.td), 2)
+        st = load_state(self.state_path)
+        self.assertEqual(sorted(st["pending"]["files"]), [self._path(f"f{i}.py") for i in range(3)])
+        self.assertEqual(st["pending"]["events"], 3)
+
+    def test_waits_for_result_and_partial_line(self):
+        self._append(_tool_use("t1", "Write", self._path("a.py"), self.td, content="x"), partial=True)
+        held = os.path.getsize(self.transcript)
+        self.assertEqual(reconcile_transcript(self.state_path, self.transcript, self.td), 0)
+        self.assertEqual(load_state(self.state_path)["meta"]["transcript_offset"], 0)
+
+        with open(self.transcript, "a", encoding="utf-8") as f:
+            f.write('}]}}\n')
+        self._append(_tool_result("t1"))
+        self.assertGreater(os.path.getsize(self.transcript), held)
+        self.assertEqual(reconcile_transcript(self.state_path, self.transcript, self.td), 1)
+        self.assertEqual(load_state(self.state_path)["meta"]["transcript_offset"], os.path.getsize(self.transcript))
+
+    def test_reads_only_new_bytes(self):
+        self._append(_tool_use("t1", "Write", self._path("a.py"), self.td, content="x"), _tool_result("t1"))
+        reconcile_transcript(self.state_path, self.transcript, self.td)
+        offset = load_state(self.state_path)["meta"]["transcript_offset"]
+
+        self._append(_tool_use("t2", "Write", self._path("b.py"), self.td, content="x"), _tool_result("t2"))
+        uses, _ = scan_transcript(self.transcript, offset, set())
+        self.assertEqual([u["id"] for u in uses], ["t2"])
+
+    def test_existing_state_without_offset_starts_at_end(self):
+        self._append(_tool_use("t1", "Write", self._path("a.py"), self.td, content="x"), _tool_result("t1"))
+        os.makedirs(os.path.dirname(self.state_path))
+        with open(self.state_path, "w", encoding="utf-8") as f:
+            json.dump({"pending": {"events": 1, "files": [], "modules": [], "lines_touched_est": 0,
+                                   "lines_touched_git": None, "flags": {}}, "meta": {}}, f)
+        self.assertEqual(reconcile_transcript(self.state_path, self.transcript, self.td), 0)
+        self.assertEqual(load_state(self.state_path)["pending"]["events"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
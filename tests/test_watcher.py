@@ -0,0 +1,171 @@
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from lib.codexreview_state import load_state, record_external_changes, update_state_from_post_tool_use
+from lib.codexreview_watcher import (
+    IN_CLOSE_WRITE,
+    IN_ISDIR,
+    Debouncer,
+    InotifyWatcher,
+    _lock_pidfile,
+    _pidfile,
+    ensure_watcher,
+    parse_events,
+    watch_session,
+    watcher_log,
+)
+
+from _isolation import isolate_state
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestWatcher(unittest.TestCase):
+    def setUp(self):
+        isolate_state(self)
+
+    def test_parse_events(self):
+        name1 = b"a.py\0\0\0\0"
+        name2 = b"sub\0"
+        buf = struct.pack("iIII", 1, IN_CLOSE_WRITE, 0, len(name1)) + name1
+        buf += struct.pack("iIII", 2, IN_ISDIR, 0, len(name2)) + name2
+        self.assertEqual(parse_events(buf), [(1, IN_CLOSE_WRITE, 0, "a.py"), (2, IN_ISDIR, 0, "sub")])
+
+    def test_debouncer_quiet_period_and_max_delay(self):
+        clock = FakeClock()
+        d = Debouncer(debounce=0.5, max_delay=2.0, clock=clock)
+        self.assertIsNone(d.timeout())
+        d.add(["a"])
+        clock.now = 0.4
+        self.assertEqual(d.flush(), [])
+        clock.now = 0.6
+        self.assertEqual(d.flush(), ["a"])
+
+        # 持续有变更：max_delay 到期也要输出
+        for t in (1.0, 1.4, 1.8, 2.2, 2.6, 3.0):
+            clock.now = t
+            d.add([f"f{t}"])
+            if t < 3.0:
+                self.assertEqual(d.flush(), [])
+        self.assertEqual(len(d.flush()), 6)
+
+    def test_external_changes_count_new_files_once(self):
+        with tempfile.TemporaryDirectory() as td:
+            state_path = os.path.join(td, "s.json")
+            a = os.path.join(td, "src", "a.py")
+            b = os.path.join(td, "package.json")
+            self.assertEqual(record_external_changes(state_path, td, [a, b]), 2)
+            self.assertEqual(record_external_changes(state_path, td, [a]), 0)
+            st = load_state(state_path)
+            self.assertEqual(st["pending"]["events"], 1)
+            self.assertEqual(sorted(st["pending"]["files"]), sorted([a, b]))
+            self.assertTrue(st["pending"]["flags"]["risk_files"])
+
+    def test_hook_claims_event_already_recorded_by_watcher(self):
+        with tempfile.TemporaryDirectory() as td:
+            state_path = os.path.join(td, "s.json")
+            a = os.path.join(td, "a.py")
+
+            def edit(path):
+                update_state_from_post_tool_use(
+                    {
+                        "session_id": "s",
+                        "cwd": td,
+                        "tool_name": "Edit",
+                        "tool_input": {"file_path": path, "old_string": "x\n", "new_string": "y\n"},
+                    },
+                    state_path,
+                )
+
+            # watcher 先记下 Edit 自身的落盘，随后到达的 hook 不再另计 event
+            record_external_changes(state_path, td, [a])
+            edit(a)
+            st = load_state(state_path)
+            self.assertEqual(st["pending"]["events"], 1)
+            self.assertEqual(st["pending"]["lines_touched_est"], 1)
+            # 同一文件之后的编辑照常计数
+            edit(a)
+            self.assertEqual(load_state(state_path)["pending"]["events"], 2)
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "inotify is Linux-only")
+    def test_inotify_recursive_watch(self):
+        with tempfile.TemporaryDirectory() as td:
+            os.makedirs(os.path.join(td, "src"))
+            os.makedirs(os.path.join(td, "node_modules", "x"))
+            with InotifyWatcher() as w:
+                w.add_tree(td, collect_files=False)
+                self.assertEqual(len(w.wd_to_dir), 2)
+
+                Path(td, "src", "a.py").write_text("x = 1\n")
+                Path(td, "node_modules", "x", "i.js").write_text("1\n")
+                changes = w.read_changes(1.0)
+                self.assertEqual(changes, {os.path.join(td, "src", "a.py")})
+
+                os.makedirs(os.path.join(td, "src", "new"))
+                changes = w.read_changes(1.0)
+                Path(td, "src", "new", "b.py").write_text("y = 2\n")
+                changes |= w.read_changes(1.0)
+                self.assertIn(os.path.join(td, "src", "new", "b.py"), changes)
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "inotify is Linux-only")
+    def test_watch_session_feeds_pending(self):
+        with tempfile.TemporaryDirectory() as td, patch(
+            "lib.codexreview_watcher.state_dir", return_value=Path(td) / "state"
+        ):
+            repo = Path(td) / "repo"
+            (repo / "src").mkdir(parents=True)
+            state_path = str(Path(td) / "state" / "s.json")
+
+            t = threading.Thread(
+                target=watch_session,
+                args=("s", str(repo), state_path),
+                kwargs={"debounce": 0.1, "max_delay": 1.0, "idle_timeout": 1.0},
+            )
+            t.start()
+            time.sleep(0.3)
+            (repo / "src" / "gen.py").write_text("generated = True\n")
+            t.join(timeout=5)
+            self.assertFalse(t.is_alive())
+
+            st = load_state(state_path)
+            self.assertEqual(st["pending"]["files"], [str(repo / "src" / "gen.py")])
+            self.assertEqual(st["pending"]["events"], 1)
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "watcher is Linux-only")
+    def test_only_one_watcher_per_session(self):
+        with tempfile.TemporaryDirectory() as td, patch(
+            "lib.codexreview_watcher.state_dir", return_value=Path(td) / "state"
+        ), patch("lib.codexreview_watcher.subprocess.Popen") as popen:
+            env = {"CODEXREVIEW_WATCH": "1"}
+            held = _lock_pidfile(_pidfile("s", td))
+            try:
+                # 已有 watcher 持有 pidfile 锁：hook 不拉起，直接启动的 watcher 立即退出
+                self.assertFalse(ensure_watcher("s", td, Path(td), env))
+                self.assertEqual(watch_session("s", td, str(Path(td) / "s.json"), idle_timeout=5), 0)
+                popen.assert_not_called()
+            finally:
+                os.close(held)
+
+            self.assertTrue(ensure_watcher("s", td, Path(td), env))
+            args, kwargs = popen.call_args
+            lock_fd = int(args[0][args[0].index("--lock-fd") + 1])
+            self.assertEqual(kwargs["pass_fds"], (lock_fd,))
+            # stderr 写入日志文件，watch 数上限等提示不会丢失
+            self.assertEqual(kwargs["stderr"].name, str(watcher_log("s", td)))
+
+
+if __name__ == "__main__":
+    unittest.main()